@@ -1,34 +1,30 @@
-import json
+import os
+import sys
 import pandas as pd
 
-# Load the GeoJSON data
-with open('local-area-boundary.geojson', 'r') as f:
-    geojson_data = json.load(f)
-
-# Extract features
-features = geojson_data['features']
+# Share the streaming GeoJSON reader with the map script
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "project")
+)
+from boundary_cache import iter_geojson_features
 
 # Create lists to store the parsed data
 names = []
 coordinates = []
 geo_points = []
 
-# Parse the features
-for feature in features:
-    name = feature['properties']['name']
-    coordinate = feature['geometry']['coordinates']
-    geo_point = feature['properties']['geo_point_2d']
+# Parse the features one at a time, without loading the whole file
+for feature in iter_geojson_features("local-area-boundary.geojson"):
+    name = feature["properties"]["name"]
+    coordinate = feature["geometry"]["coordinates"]
+    geo_point = feature["properties"]["geo_point_2d"]
 
     names.append(name)
     coordinates.append(coordinate)
     geo_points.append(geo_point)
 
 # Create a DataFrame for better readability
-df = pd.DataFrame({
-    'Name': names,
-    'Coordinates': coordinates,
-    'Geo Point': geo_points
-})
+df = pd.DataFrame({"Name": names, "Coordinates": coordinates, "Geo Point": geo_points})
 
 # Print the DataFrame
 print(df)
@@ -0,0 +1,114 @@
+import os
+import shutil
+import subprocess
+from multiprocessing import Pool
+from typing import Optional
+import numpy as np
+from constants import COMPARTMENT_COLORS
+from snapshot_store import SnapshotStore
+
+# Figure of the current worker process, created once by _init_worker
+_worker = {}
+
+
+def _init_worker(snapshot_dir: str, layout_path: str, frames_dir: str, dpi: int):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import to_rgba_array
+    from community_view import compartment_legend
+
+    positions = np.load(layout_path, mmap_mode="r")
+    fig, ax = plt.subplots(figsize=(8, 8))
+    ax.set_axis_off()
+    nodes = ax.scatter(positions[:, 0], positions[:, 1], s=2, linewidths=0)
+    compartment_legend(ax)
+    _worker.update(
+        store=SnapshotStore.load(snapshot_dir),
+        palette=to_rgba_array(COMPARTMENT_COLORS),
+        fig=fig,
+        ax=ax,
+        nodes=nodes,
+        frames_dir=frames_dir,
+        dpi=dpi,
+    )
+
+
+# Render a contiguous run of weeks, so the store only replays deltas forward
+def _render_weeks(weeks: range) -> list:
+    paths = []
+    for week in weeks:
+        states = _worker["store"].states(week)
+        _worker["nodes"].set_facecolor(_worker["palette"][states])
+        _worker["ax"].set_title(f"Week {week}")
+        path = os.path.join(_worker["frames_dir"], f"week_{week:04d}.png")
+        _worker["fig"].savefig(path, dpi=_worker["dpi"])
+        paths.append(path)
+    return paths
+
+
+def encode_frames(frame_paths: list, output_path: str, fps: int = 8):
+    if output_path.endswith(".gif"):
+        from PIL import Image
+
+        frames = [Image.open(path) for path in frame_paths]
+        frames[0].save(
+            output_path,
+            save_all=True,
+            append_images=frames[1:],
+            duration=int(1000 / fps),
+            loop=0,
+        )
+        return
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError("ffmpeg is required to encode video, use a .gif output")
+    pattern = os.path.join(os.path.dirname(frame_paths[0]), "week_%04d.png")
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-loglevel",
+            "error",
+            "-framerate",
+            str(fps),
+            "-i",
+            pattern,
+            "-vf",
+            "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-pix_fmt",
+            "yuv420p",
+            output_path,
+        ],
+        check=True,
+    )
+
+
+# Render every weekly snapshot to PNG in a process pool, then encode them
+def export_animation(
+    snapshot_dir: str,
+    layout_path: str,
+    output_path: str,
+    frames_dir: str,
+    workers: Optional[int] = None,
+    dpi: int = 100,
+    fps: int = 8,
+):
+    if workers is None:
+        workers = os.cpu_count()
+    os.makedirs(frames_dir, exist_ok=True)
+    total_weeks = len(SnapshotStore.load(snapshot_dir))
+    chunk = -(-total_weeks // workers)
+    tasks = [
+        range(start, min(start + chunk, total_weeks))
+        for start in range(0, total_weeks, chunk)
+    ]
+    with Pool(
+        workers,
+        initializer=_init_worker,
+        initargs=(snapshot_dir, layout_path, frames_dir, dpi),
+    ) as pool:
+        frame_paths = [
+            path for paths in pool.map(_render_weeks, tasks) for path in paths
+        ]
+    encode_frames(frame_paths, output_path, fps)
@@ -0,0 +1,332 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from constants import REGIONS
+
+# Phases in the order they run; each one runs in its own process so the peak
+# RSS belongs to that phase (plus its setup) only
+PHASES = ("build", "build_networkx", "history", "step_dict", "snapshots", "render")
+# Phases of the dict-of-dicts engine, skipped above --max-dict-nodes
+DICT_PHASES = ("build_networkx", "step_dict")
+DEFAULT_CASES = ("vancouver", "bc", "vancouver_full", "vancouver_full_x2")
+# Slower than the baseline by more than this share counts as a regression
+REGRESSION_TOLERANCE = 0.10
+# ... but only once the best run is also slower by more than this many
+# seconds, so millisecond phases do not report timer noise
+NOISE_FLOOR_SECONDS = 0.05
+# Stored results of the default suite, regenerate with --output
+BASELINE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json"
+)
+
+
+# Region from constants.REGIONS, or "<region>_x<k>": every population scaled by k
+def benchmark_case(name: str):
+    region, _, scale = name.partition("_x")
+    if region not in REGIONS:
+        raise ValueError(f"Unknown benchmark case {name}")
+    density_list, inter_region_connections = REGIONS[region]
+    if scale:
+        density_list = [
+            {**city, "population": city["population"] * int(scale)}
+            for city in density_list
+        ]
+    return density_list, inter_region_connections
+
+
+def _timed(setup, run, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# Run one phase of one case in this process; returns its measurements
+def run_phase(case: str, phase: str, weeks: int, seed: int, repeat: int) -> dict:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from csr_engine import get_initial_states, get_status_history_csr
+    from graph_builder import build_community_csr
+    from layout import compute_layout
+    from snapshot_store import SnapshotStore
+    import report_line_dot_graph_model as model
+
+    density_list, inter_region_connections = benchmark_case(case)
+    graph = build_community_csr(density_list, inter_region_connections, seed)
+    num_nodes, num_edges = graph.num_nodes, graph.num_edges
+    # Work units the throughput is reported in, per phase
+    nodes_processed, edges_processed = num_nodes, num_edges
+
+    def seeded_history(record_snapshots):
+        rng = np.random.default_rng(seed)
+        states, infected = get_initial_states(graph, rng=rng)
+        return get_status_history_csr(
+            None,
+            states,
+            infected,
+            weeks,
+            graph=graph,
+            rng=rng,
+            record_snapshots=record_snapshots,
+        )
+
+    if phase == "build":
+        seconds = _timed(
+            lambda: None,
+            lambda _: build_community_csr(density_list, inter_region_connections, seed),
+            repeat,
+        )
+    elif phase == "build_networkx":
+        seconds = _timed(
+            lambda: None,
+            lambda _: model.create_community_graph(
+                density_list, inter_region_connections, seed
+            ),
+            repeat,
+        )
+    elif phase == "history":
+        seconds = _timed(lambda: None, lambda _: seeded_history(False), repeat)
+        nodes_processed, edges_processed = 7 * weeks * num_nodes, 7 * weeks * num_edges
+    elif phase == "step_dict":
+        G = model.create_community_graph(density_list, inter_region_connections, seed)
+
+        def setup():
+            random.seed(seed)
+            return model.get_initial_infection_status(G)
+
+        seconds = _timed(
+            setup, lambda initial: model.get_status_history(G, *initial, 1), repeat
+        )
+        nodes_processed, edges_processed = 7 * num_nodes, 7 * num_edges
+    elif phase == "snapshots":
+        snapshots = seeded_history(True)["infection_status_dict_snapshots"]
+
+        # Spill to disk, reload memory-mapped and replay every week
+        def run(path):
+            snapshots.spill(path)
+            store = SnapshotStore.load(path)
+            for week in range(len(store)):
+                store.states(week)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            seconds = _timed(lambda: tempfile.mkdtemp(dir=tmp_dir), run, repeat)
+        nodes_processed = edges_processed = weeks * num_nodes
+    elif phase == "render":
+        snapshots = seeded_history(True)["infection_status_dict_snapshots"]
+        positions = compute_layout(graph, seed)
+
+        # Build the dot graph and draw every week through its slider
+        def run(_):
+            model.visualize_simulation_dotted_graph(None, snapshots, weeks, positions)
+            fig = plt.gcf()
+            for week in range(weeks):
+                fig.slider.set_val(week)
+                fig.canvas.draw()
+            plt.close(fig)
+
+        seconds = _timed(lambda: None, run, repeat)
+        nodes_processed = edges_processed = weeks * num_nodes
+    else:
+        raise ValueError(f"Unknown benchmark phase {phase}")
+
+    return {
+        "case": case,
+        "phase": phase,
+        "nodes": num_nodes,
+        "edges": num_edges,
+        "wall_seconds": seconds,
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / (1024 * 1024 if sys.platform == "darwin" else 1024),
+        "nodes_per_second": nodes_processed / seconds,
+        "edges_per_second": edges_processed / seconds,
+    }
+
+
+# Run one phase in a fresh interpreter and read its JSON result
+def run_isolated(case: str, phase: str, weeks: int, seed: int, repeat: int) -> dict:
+    job = json.dumps(
+        {"case": case, "phase": phase, "weeks": weeks, "seed": seed, "repeat": repeat}
+    )
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--phase-job", job],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{case}/{phase} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+# Slowdown of every phase that is also in the baseline, as current / baseline
+def compare_to_baseline(results: list, baseline: dict) -> list:
+    reference = {(item["case"], item["phase"]): item for item in baseline["results"]}
+    comparison = []
+    for item in results:
+        before = reference.get((item["case"], item["phase"]))
+        if before is not None:
+            ratio = item["wall_seconds"] / before["wall_seconds"]
+            comparison.append(
+                {**item, "baseline_seconds": before["wall_seconds"], "ratio": ratio}
+            )
+    return comparison
+
+
+def is_regression(item: dict, tolerance: float, noise_floor: float) -> bool:
+    return (
+        item["ratio"] > 1 + tolerance
+        and item["wall_seconds"] - item["baseline_seconds"] > noise_floor
+    )
+
+
+def print_results(
+    results: list, comparison: list, tolerance: float, noise_floor: float
+):
+    compared = {(item["case"], item["phase"]): item for item in comparison}
+    print(
+        f"{'case':<20}{'phase':<16}{'nodes':>10}{'seconds':>10}{'peak MB':>10}"
+        f"{'nodes/s':>12}{'edges/s':>12}{'vs base':>10}"
+    )
+    for item in results:
+        before = compared.get((item["case"], item["phase"]))
+        mark = ""
+        if before is not None:
+            mark = f"{before['ratio']:.2f}x"
+            if is_regression(before, tolerance, noise_floor):
+                mark += " !"
+        print(
+            f"{item['case']:<20}{item['phase']:<16}{item['nodes']:>10}"
+            f"{item['wall_seconds']:>10.3f}{item['peak_rss_mb']:>10.0f}"
+            f"{item['nodes_per_second']:>12.3g}{item['edges_per_second']:>12.3g}"
+            f"{mark:>10}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Seeded benchmarks of graph build, simulation, snapshots and rendering"
+    )
+    parser.add_argument(
+        "--cases",
+        nargs="+",
+        default=list(DEFAULT_CASES),
+        help="Regions from constants.REGIONS, or <region>_x<k> for populations "
+        "scaled up k times",
+    )
+    parser.add_argument("--phases", nargs="+", choices=PHASES, default=list(PHASES))
+    parser.add_argument("--weeks", type=int, default=10, help="Simulated weeks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Timed runs per phase; only the best one is reported and compared",
+    )
+    parser.add_argument(
+        "--max-dict-nodes",
+        type=int,
+        default=1_000_000,
+        help="Skip the dict engine phases on graphs larger than this",
+    )
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    parser.add_argument(
+        "--baseline",
+        default=BASELINE_FILE,
+        help="Baseline JSON to compare against (default: the stored "
+        "benchmark_baseline.json, if present; '' to skip)",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=REGRESSION_TOLERANCE,
+        help="Allowed slowdown over the baseline before it counts as a regression",
+    )
+    parser.add_argument(
+        "--noise-floor",
+        type=float,
+        default=NOISE_FLOOR_SECONDS,
+        help="Slowdowns of fewer seconds than this never count as a regression",
+    )
+    parser.add_argument("--phase-job", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase_job is not None:
+        print(json.dumps(run_phase(**json.loads(args.phase_job))))
+        return
+
+    results = []
+    for case in args.cases:
+        population = sum(city["population"] for city in benchmark_case(case)[0])
+        for phase in args.phases:
+            if phase in DICT_PHASES and population > args.max_dict_nodes:
+                continue
+            print(f"Running {case}/{phase}...", file=sys.stderr)
+            results.append(
+                run_isolated(case, phase, args.weeks, args.seed, args.repeat)
+            )
+
+    comparison = []
+    # A missing stored baseline just skips the comparison, e.g. on first run
+    if args.baseline and (
+        args.baseline != BASELINE_FILE or os.path.exists(BASELINE_FILE)
+    ):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        comparison = compare_to_baseline(results, baseline)
+        if baseline["meta"].get("cpus") != os.cpu_count():
+            print(
+                f"Note: the baseline was recorded on {baseline['meta'].get('cpus')} "
+                f"CPU(s), this machine has {os.cpu_count()}",
+                file=sys.stderr,
+            )
+    print_results(results, comparison, args.tolerance, args.noise_floor)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "meta": {
+                        "weeks": args.weeks,
+                        "seed": args.seed,
+                        "repeat": args.repeat,
+                        "python": platform.python_version(),
+                        "numpy": np.__version__,
+                        "machine": platform.machine(),
+                        "cpus": os.cpu_count(),
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+    regressions = [
+        item
+        for item in comparison
+        if is_regression(item, args.tolerance, args.noise_floor)
+    ]
+    if regressions:
+        print(
+            f"{len(regressions)} phase(s) slower than the baseline by more than "
+            f"{args.tolerance:.0%} and {args.noise_floor * 1000:.0f} ms",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Iterator
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from cache_paths import CACHE_DIR
+
+# Bump when the parsing, simplification or the file layout changes
+BOUNDARY_CACHE_VERSION = 1
+READ_CHUNK = 1 << 16
+
+
+# Yield the features of a GeoJSON FeatureCollection one at a time, reading the
+# file in chunks instead of decoding the whole document at once
+def iter_geojson_features(path: str, chunk_size: int = READ_CHUNK) -> Iterator[dict]:
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        # Skip ahead to the opening bracket of the "features" array
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            buffer += chunk
+            key = buffer.find('"features"')
+            if key >= 0:
+                bracket = buffer.find("[", key)
+                if bracket >= 0:
+                    buffer = buffer[bracket + 1 :]
+                    break
+
+        while True:
+            buffer = buffer.lstrip(" \t\r\n,")
+            if buffer.startswith("]"):
+                return
+            try:
+                feature, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                # The feature continues in the next chunk
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer += chunk
+                continue
+            yield feature
+            buffer = buffer[end:]
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def boundary_cache_path(
+    path: str, tolerance: float, precision: float, cache_dir: str = CACHE_DIR
+) -> str:
+    payload = json.dumps(
+        {
+            "version": BOUNDARY_CACHE_VERSION,
+            "mtime_ns": os.stat(path).st_mtime_ns,
+            "sha256": _file_sha256(path),
+            "tolerance": tolerance,
+            "precision": precision,
+        },
+        sort_keys=True,
+    )
+    key = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, "boundaries", f"{stem}-{key}.npz")
+
+
+# Parse, simplify and round every boundary, packed as WKB bytes plus offsets
+def preprocess_boundaries(path: str, tolerance: float, precision: float) -> dict:
+    names, geometries, centroids = [], [], []
+    for feature in iter_geojson_features(path):
+        properties = feature["properties"]
+        names.append(properties["name"])
+        geometries.append(shape(feature["geometry"]))
+        point = properties.get("geo_point_2d")
+        centroids.append((point["lon"], point["lat"]) if point else (np.nan, np.nan))
+
+    geometries = np.array(geometries, dtype=object)
+    geometries = shapely.set_precision(
+        shapely.simplify(geometries, tolerance, preserve_topology=True), precision
+    )
+    wkb = shapely.to_wkb(geometries)
+    return {
+        "names": np.array(names),
+        "wkb": np.frombuffer(b"".join(wkb), dtype=np.uint8),
+        "offsets": np.cumsum([0] + [len(item) for item in wkb], dtype=np.int64),
+        "centroids": np.array(centroids, dtype=np.float64).reshape(-1, 2),
+    }
+
+
+def _boundaries_frame(arrays) -> gpd.GeoDataFrame:
+    wkb, offsets = arrays["wkb"].tobytes(), arrays["offsets"]
+    geometries = shapely.from_wkb(
+        [wkb[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    )
+    return gpd.GeoDataFrame(
+        {
+            "name": arrays["names"].tolist(),
+            "lon": arrays["centroids"][:, 0],
+            "lat": arrays["centroids"][:, 1],
+        },
+        geometry=geometries,
+        crs="EPSG:4326",
+    )
+
+
+# Boundaries of a GeoJSON file as a GeoDataFrame (name, geo_point_2d centroid
+# as lon/lat, simplified geometry), parsed once and then read from the cache
+def load_boundaries(
+    path: str,
+    tolerance: float = 0.0005,
+    precision: float = 1e-5,
+    rebuild: bool = False,
+    cache_dir: str = CACHE_DIR,
+) -> gpd.GeoDataFrame:
+    cache_file = boundary_cache_path(path, tolerance, precision, cache_dir)
+    if rebuild or not os.path.exists(cache_file):
+        arrays = preprocess_boundaries(path, tolerance, precision)
+        # Write next to the target and rename so readers never see a partial file
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_file, cache_file)
+        return _boundaries_frame(arrays)
+    with np.load(cache_file) as arrays:
+        return _boundaries_frame(arrays)
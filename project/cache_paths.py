@@ -0,0 +1,6 @@
+import os
+
+# Every cache (graphs, boundaries, JHU data, models) lives next to the data
+# directory; this module imports nothing else from the project, so the data
+# and model scripts can use it without loading the graph stack
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache")
@@ -0,0 +1,161 @@
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba_array
+from matplotlib.widgets import Slider
+import networkx as nx
+import numpy as np
+from constants import COMPARTMENTS, COMPARTMENT_NAMES, COMPARTMENT_COLORS
+from csr_engine import CSRGraph
+from layout import community_layout
+
+
+# Number of edges between every pair of communities (the inter-region edges)
+def community_edge_counts(graph: CSRGraph) -> np.ndarray:
+    community = graph.node_community()
+    num_communities = len(graph.community_offsets) - 1
+    sources = np.repeat(community, np.diff(graph.indptr))
+    targets = community[graph.indices]
+    between = sources < targets
+    counts = np.bincount(
+        sources[between] * num_communities + targets[between],
+        minlength=num_communities * num_communities,
+    )
+    return counts.reshape(num_communities, num_communities)
+
+
+# (weeks, communities, compartments) counts, straight from the CSR engine when
+# it tracked them, otherwise tallied once from the snapshots
+def weekly_community_counts(weekly_data: dict, graph: CSRGraph) -> np.ndarray:
+    if weekly_data.get("community_counts"):
+        return np.array(weekly_data["community_counts"])
+    community = graph.node_community()
+    num_communities = len(graph.community_offsets) - 1
+    counts = []
+    snapshots = weekly_data["infection_status_dict_snapshots"]
+    for week in range(len(snapshots)):
+        states = snapshots.states(week)
+        tally = np.bincount(
+            community * len(COMPARTMENTS) + states,
+            minlength=num_communities * len(COMPARTMENTS),
+        )
+        counts.append(tally.reshape(num_communities, len(COMPARTMENTS)))
+    return np.array(counts)
+
+
+# Legend of the five compartment colours, shared by every node-level plot
+def compartment_legend(ax):
+    ax.legend(
+        handles=[
+            plt.Line2D(
+                [0],
+                [0],
+                marker="o",
+                color="w",
+                markerfacecolor=color,
+                markersize=10,
+                label=name,
+            )
+            for name, color in zip(COMPARTMENT_NAMES, COMPARTMENT_COLORS)
+        ],
+        loc="upper right",
+    )
+
+
+# Node-level view of a single community, opened from the community view
+def visualize_single_community(
+    graph: CSRGraph, snapshots, community: int, name: str, week: int
+):
+    start = graph.community_offsets[community]
+    end = graph.community_offsets[community + 1]
+    positions = community_layout(graph, start, end)
+    palette = to_rgba_array(COMPARTMENT_COLORS)
+
+    fig, ax = plt.subplots()
+    plt.subplots_adjust(left=0.1, bottom=0.25)
+    ax.set_axis_off()
+    nodes = ax.scatter(positions[:, 0], positions[:, 1], s=10, linewidths=0)
+    compartment_legend(ax)
+    ax_slider = plt.axes([0.1, 0.1, 0.8, 0.05], facecolor="lightgoldenrodyellow")
+    slider = Slider(ax_slider, "Week", 0, len(snapshots) - 1, valinit=week, valstep=1)
+
+    def slider_update(val):
+        week = int(val)
+        nodes.set_facecolor(palette[snapshots.states(week)[start:end]])
+        ax.set_title(f"{name} - Week {week}")
+        fig.canvas.draw_idle()
+
+    slider.on_changed(slider_update)
+    slider_update(week)
+    # Keep the slider alive as long as the figure
+    fig.slider = slider
+    fig.show()
+
+
+# One super-node per community, sized by population and colored by its
+# S/E/I/R/D mix; clicking a super-node opens that community's node-level view
+def visualize_community_graph(
+    graph: CSRGraph,
+    community_counts: np.ndarray,  # (weeks, communities, compartments)
+    community_names: list,
+    snapshots=None,
+):
+    total_weeks = len(community_counts)
+    populations = np.diff(graph.community_offsets)
+    edge_counts = community_edge_counts(graph)
+    palette = to_rgba_array(COMPARTMENT_COLORS)
+
+    # Lay the super-nodes out by their inter-region edge weights
+    community_graph = nx.Graph()
+    community_graph.add_nodes_from(range(len(populations)))
+    for a, b in zip(*np.nonzero(edge_counts)):
+        community_graph.add_edge(int(a), int(b), weight=int(edge_counts[a, b]))
+    layout = nx.spring_layout(community_graph, seed=0, weight="weight")
+    positions = np.array([layout[idx] for idx in range(len(populations))])
+
+    fig, ax = plt.subplots()
+    plt.subplots_adjust(left=0.1, bottom=0.25)
+    ax.set_axis_off()
+    pairs = np.transpose(np.nonzero(edge_counts))
+    ax.add_collection(
+        LineCollection(
+            positions[pairs],
+            linewidths=0.5 + 4 * edge_counts[tuple(pairs.T)] / edge_counts.max(),
+            colors="lightgray",
+            zorder=1,
+        )
+    )
+    sizes = 2000 * populations / populations.max() + 20
+    super_nodes = ax.scatter(
+        positions[:, 0], positions[:, 1], s=sizes, picker=True, zorder=2
+    )
+    for idx, name in enumerate(community_names):
+        ax.annotate(name, positions[idx], fontsize=7, ha="center", va="center")
+    compartment_legend(ax)
+
+    ax_slider = plt.axes([0.1, 0.1, 0.8, 0.05], facecolor="lightgoldenrodyellow")
+    slider = Slider(ax_slider, "Week", 0, total_weeks - 1, valinit=0, valstep=1)
+
+    def slider_update(val):
+        week = int(val)
+        # Mix the compartment colors by each community's share of the population
+        shares = community_counts[week] / populations[:, None]
+        super_nodes.set_facecolor(np.clip(shares @ palette, 0, 1))
+        ax.set_title(f"Communities - Week {week}")
+        fig.canvas.draw_idle()
+
+    def on_pick(event):
+        if snapshots is None or event.artist is not super_nodes:
+            return
+        for community in event.ind[:1]:
+            visualize_single_community(
+                graph,
+                snapshots,
+                int(community),
+                community_names[community],
+                int(slider.val),
+            )
+
+    slider.on_changed(slider_update)
+    fig.canvas.mpl_connect("pick_event", on_pick)
+    slider_update(0)
+    plt.show()
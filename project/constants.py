@@ -1,3 +1,8 @@
+import csv
+import os
+import re
+from typing import NamedTuple, Tuple
+
 # Constants for BC/ Vancouver
 # Population density of BC cities
 BC_POPULATION_DENSITY = [
@@ -108,8 +113,32 @@ VAN_POPULATION_DENSITY_FULL = [
     {"name": "West Point Grey", "population": 13771, "density": 2},
 ]
 
+# Directory of the city/community CSV files the tables above were made from
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+# Unscaled populations from one of the data files, with the density shifted
+# by one (Normalized_Density + 1) like the tables above
+def read_population_density(file_name: str) -> list:
+    with open(os.path.join(DATA_DIR, file_name), newline="") as f:
+        return [
+            {
+                # Drop footnote markers such as "Vancouver[a]"
+                "name": re.sub(r"\[.*?\]", "", row["Name"]).strip(),
+                "population": int(row["Population"]),
+                "density": int(row["Normalized_Density"]) + 1,
+            }
+            for row in csv.DictReader(f)
+        ]
+
+
+# Real BC city populations (millions of nodes in total)
+BC_POPULATION_DENSITY_FULL = read_population_density("cities_bc.csv")
+# Canadian provinces and territories, for the hybrid engine
+CANADA_POPULATION_DENSITY = read_population_density("provinces_ca.csv")
+
 # Inter-regional connections
-INTER_REGION_CONNECTIONS = {"BC": 1145, "Vancouver": 55}
+INTER_REGION_CONNECTIONS = {"BC": 1145, "Vancouver": 55, "Canada": 1145}
 
 # COVID-19 Simulation Parameters
 # Initial infection rate, recovery rate, mortality rate, incubation period, and mutation weeks
@@ -119,3 +148,42 @@ MORTALITY_RATE = 0.01
 INCUBATION_PERIOD = 5
 MUTATION_WEEKS = [48, 96]
 MUTATION_RATE = 1.2
+
+
+# The parameters above bundled together, so the simulators can take them explicitly
+class EpidemicParameters(NamedTuple):
+    initial_infection_rate: float = INITIAL_INFECTION_RATE
+    recovery_rate: float = RECOVERY_RATE
+    mortality_rate: float = MORTALITY_RATE
+    incubation_period: int = INCUBATION_PERIOD
+    mutation_weeks: Tuple[int, ...] = tuple(MUTATION_WEEKS)
+    mutation_rate: float = MUTATION_RATE
+
+
+DEFAULT_PARAMETERS = EpidemicParameters()
+
+# Region name -> (population density list, inter-regional connections)
+REGIONS = {
+    "bc": (BC_POPULATION_DENSITY, INTER_REGION_CONNECTIONS["BC"]),
+    "vancouver": (
+        VAN_POPULATION_DENSITY_REDUCED,
+        INTER_REGION_CONNECTIONS["Vancouver"],
+    ),
+    "vancouver_full": (
+        VAN_POPULATION_DENSITY_FULL,
+        INTER_REGION_CONNECTIONS["Vancouver"],
+    ),
+    "bc_full": (BC_POPULATION_DENSITY_FULL, INTER_REGION_CONNECTIONS["BC"]),
+    "canada": (CANADA_POPULATION_DENSITY, INTER_REGION_CONNECTIONS["Canada"]),
+}
+# Regions too large for the dict engine and the node-level dot graph
+FULL_POPULATION_REGIONS = ("bc_full", "canada")
+# Regions run on the hybrid compartment / node-level engine by default
+HYBRID_REGIONS = ("canada",)
+# Default memory budget of the full-population mode, in GB
+MEMORY_BUDGET_GB = 24
+
+# Compartment labels, in the order of their uint8 codes in the array engines
+COMPARTMENTS = ["S", "E", "I", "R", "D"]
+COMPARTMENT_NAMES = ["Susceptible", "Exposed", "Infected", "Recovered", "Dead"]
+COMPARTMENT_COLORS = ["blue", "orange", "red", "green", "black"]
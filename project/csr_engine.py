@@ -0,0 +1,337 @@
+from typing import Callable, Iterator, NamedTuple, Optional, Tuple
+import networkx as nx
+import numpy as np
+from constants import COMPARTMENTS, DEFAULT_PARAMETERS, EpidemicParameters
+from instrumentation import instrumentation
+from snapshot_store import SnapshotStore
+
+# Compartment codes stored in the uint8 state array
+SUSCEPTIBLE, EXPOSED, INFECTED, RECOVERED, DEAD = 0, 1, 2, 3, 4
+STATE_LABELS = np.array(COMPARTMENTS)
+STATE_CODES = {label: code for code, label in enumerate(STATE_LABELS)}
+
+
+class CSRGraph(NamedTuple):
+    # Neighbors of node v are indices[indptr[v]:indptr[v + 1]]
+    indptr: np.ndarray
+    indices: np.ndarray
+    # Nodes of community c are community_offsets[c]:community_offsets[c + 1]
+    community_offsets: Optional[np.ndarray] = None
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices) // 2
+
+    def node_community(self) -> np.ndarray:
+        if self.community_offsets is None:
+            return np.zeros(self.num_nodes, dtype=np.int32)
+        sizes = np.diff(self.community_offsets)
+        return np.repeat(np.arange(len(sizes), dtype=np.int32), sizes)
+
+
+# Build CSR arrays from an undirected edge list
+def edges_to_csr(sources: np.ndarray, targets: np.ndarray, num_nodes: int) -> CSRGraph:
+    both_sources = np.concatenate([sources, targets])
+    both_targets = np.concatenate([targets, sources])
+    order = np.argsort(both_sources, kind="stable")
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(both_sources, minlength=num_nodes), out=indptr[1:])
+    return CSRGraph(indptr, both_targets[order].astype(np.int32))
+
+
+# Convert a community graph into CSR arrays
+def graph_to_csr(G: nx.Graph) -> CSRGraph:
+    # Nodes of create_community_graph are already the integers 0..N-1
+    edges = np.fromiter(
+        (node for edge in G.edges for node in edge),
+        dtype=np.int64,
+        count=2 * G.number_of_edges(),
+    ).reshape(-1, 2)
+    return edges_to_csr(edges[:, 0], edges[:, 1], G.number_of_nodes())
+
+
+# Gather the (source, target) pairs of every edge leaving the given nodes
+def gather_edges(graph: CSRGraph, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    starts = graph.indptr[nodes]
+    degrees = graph.indptr[nodes + 1] - starts
+    total = int(degrees.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=graph.indices.dtype)
+    # Position of every gathered edge inside indices
+    group_offsets = np.cumsum(degrees) - degrees
+    positions = np.arange(total) - np.repeat(group_offsets - starts, degrees)
+    return np.repeat(nodes, degrees), graph.indices[positions]
+
+
+# Initialize Infection Status without going through networkx
+def get_initial_states(
+    graph: CSRGraph,
+    num_initial_infections=20,
+    rng: Optional[np.random.Generator] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    if rng is None:
+        rng = np.random.default_rng()
+    states = np.zeros(graph.num_nodes, dtype=np.uint8)
+    initial_infected = rng.choice(
+        graph.num_nodes, num_initial_infections, replace=False
+    )
+    states[initial_infected] = EXPOSED
+    return states, initial_infected
+
+
+def states_from_dict(num_nodes: int, infection_status_dict) -> np.ndarray:
+    # Initial states may already be a state array from get_initial_states
+    if isinstance(infection_status_dict, np.ndarray):
+        return infection_status_dict.astype(np.uint8)
+    states = np.zeros(num_nodes, dtype=np.uint8)
+    count = len(infection_status_dict)
+    nodes = np.fromiter(infection_status_dict.keys(), dtype=np.int64, count=count)
+    states[nodes] = np.fromiter(
+        map(STATE_CODES.__getitem__, infection_status_dict.values()),
+        dtype=np.uint8,
+        count=count,
+    )
+    return states
+
+
+class FrontierState:
+    # Only exposed and infected nodes can change state, so each day works on
+    # the infected set and on the bucket of exposed nodes that mature that day
+    def __init__(
+        self,
+        states: np.ndarray,
+        incubation_period: int,
+        community: Optional[np.ndarray] = None,
+    ):
+        self.states = states
+        self.infected = np.flatnonzero(states == INFECTED)
+        self.incubation_days = max(incubation_period, 1)
+        # Node exposed on day d becomes infected on day d + incubation_days,
+        # so bucket d % incubation_days is emptied and refilled the same day
+        self.incubating = [
+            np.empty(0, dtype=np.int64) for _ in range(self.incubation_days)
+        ]
+        # Initial exposures count as exposed the day before the simulation starts
+        self.incubating[-1] = np.flatnonzero(states == EXPOSED)
+        self.day = 0
+        # Compartment sizes, updated from each day's transitions
+        self.counts = np.bincount(states, minlength=len(COMPARTMENTS))
+        # Optional per-community counters, indexed by a node -> community array
+        self.community = community
+        if community is not None:
+            num_communities = int(community.max()) + 1
+            self.community_counts = np.zeros(
+                (num_communities, len(COMPARTMENTS)), dtype=np.int64
+            )
+            np.add.at(self.community_counts, (community, states), 1)
+            # Cases so far: initial exposures/infections plus every E -> I
+            self.community_cases = (
+                self.community_counts[:, EXPOSED] + self.community_counts[:, INFECTED]
+            )
+            self.community_deaths = self.community_counts[:, DEAD].copy()
+
+    def _community_bincount(self, nodes: np.ndarray) -> np.ndarray:
+        return np.bincount(self.community[nodes], minlength=len(self.community_counts))
+
+    def apply_community_transitions(self, newly_exposed, matured, died, recovered):
+        exposed = self._community_bincount(newly_exposed)
+        infected = self._community_bincount(matured)
+        dead = self._community_bincount(died)
+        removed = self._community_bincount(recovered)
+        self.community_counts[:, SUSCEPTIBLE] -= exposed
+        self.community_counts[:, EXPOSED] += exposed - infected
+        self.community_counts[:, INFECTED] += infected - dead - removed
+        self.community_counts[:, RECOVERED] += removed
+        self.community_counts[:, DEAD] += dead
+        self.community_cases += infected
+        self.community_deaths += dead
+
+    def num_active(self) -> int:
+        return len(self.infected) + sum(len(bucket) for bucket in self.incubating)
+
+
+def simulate_day_csr(
+    graph: CSRGraph,
+    frontier: FrontierState,
+    infection_rate: float,
+    rng: np.random.Generator,
+    params: EpidemicParameters = DEFAULT_PARAMETERS,
+) -> Tuple[int, int]:
+    states = frontier.states
+    slot = frontier.day % frontier.incubation_days
+    matured = frontier.incubating[slot]
+    infected = frontier.infected
+
+    # Transmission along every edge leaving an infected node
+    _, targets = gather_edges(graph, infected)
+    edges_examined = len(targets)
+    targets = targets[states[targets] == SUSCEPTIBLE]
+    newly_exposed = np.unique(targets[rng.random(len(targets)) < infection_rate])
+
+    # Death or Recovery
+    died = rng.random(len(infected)) < params.mortality_rate
+    recovered = ~died & (rng.random(len(infected)) < params.recovery_rate)
+
+    # All transitions read the start-of-day states, so apply them together
+    states[newly_exposed] = EXPOSED
+    states[matured] = INFECTED
+    states[infected[died]] = DEAD
+    states[infected[recovered]] = RECOVERED
+
+    num_died, num_recovered = int(died.sum()), int(recovered.sum())
+    frontier.counts[SUSCEPTIBLE] -= len(newly_exposed)
+    frontier.counts[EXPOSED] += len(newly_exposed) - len(matured)
+    frontier.counts[INFECTED] += len(matured) - num_died - num_recovered
+    frontier.counts[RECOVERED] += num_recovered
+    frontier.counts[DEAD] += num_died
+    if frontier.community is not None:
+        frontier.apply_community_transitions(
+            newly_exposed, matured, infected[died], infected[recovered]
+        )
+
+    frontier.incubating[slot] = newly_exposed
+    frontier.infected = np.concatenate([infected[~died & ~recovered], matured])
+    frontier.day += 1
+    if instrumentation.enabled:
+        instrumentation.record_day(
+            nodes_scanned=len(infected) + len(matured),
+            edges_examined=edges_examined,
+            rng_draws=len(targets) + 2 * len(infected),
+            transitions=len(newly_exposed) + len(matured) + num_died + num_recovered,
+        )
+    return len(matured), num_died
+
+
+# Weekly Reporting
+def simulate_week_csr(
+    graph: CSRGraph,
+    frontier: FrontierState,
+    infection_rate: float,
+    rng: np.random.Generator,
+    params: EpidemicParameters = DEFAULT_PARAMETERS,
+) -> Tuple[int, int]:
+    new_cases = 0
+    deaths = 0
+
+    for _ in range(7):  # Simulate 7 days per week
+        day_cases, day_deaths = simulate_day_csr(
+            graph, frontier, infection_rate, rng, params
+        )
+        new_cases += day_cases
+        deaths += day_deaths
+
+    return new_cases, deaths
+
+
+# Early-stop predicate: no exposed or infected nodes are left
+def extinct(record: dict) -> bool:
+    return record["E"] + record["I"] == 0
+
+
+# Early-stop predicate: cumulative cases reached the given number
+def case_threshold(cases: int) -> Callable[[dict], bool]:
+    return lambda record: record["cumulative_cases"] >= cases
+
+
+# Yield each week's record as soon as it is simulated
+def iter_status_history(
+    graph: CSRGraph,
+    initial_infection_status_dict,
+    initial_infected: list,
+    total_weeks: int,
+    rng: Optional[np.random.Generator] = None,
+    params: EpidemicParameters = DEFAULT_PARAMETERS,
+    snapshots: Optional[SnapshotStore] = None,
+    stop_when: Optional[Callable[[dict], bool]] = None,
+    track_communities: bool = False,
+) -> Iterator[dict]:
+    if rng is None:
+        rng = np.random.default_rng()
+
+    states = states_from_dict(graph.num_nodes, initial_infection_status_dict)
+    community = graph.node_community() if track_communities else None
+    frontier = FrontierState(states, params.incubation_period, community)
+    cumulative_cases = len(initial_infected)
+    infection_rate = params.initial_infection_rate
+
+    for week in range(total_weeks):
+        # Mutation Effect
+        if week in params.mutation_weeks:
+            infection_rate *= params.mutation_rate
+
+        # No exposed or infected nodes left, so nothing changes any more
+        if frontier.num_active() == 0:
+            new_cases, deaths = 0, 0
+        else:
+            with instrumentation.phase("step", week=week + 1):
+                new_cases, deaths = simulate_week_csr(
+                    graph, frontier, infection_rate, rng, params
+                )
+        cumulative_cases += new_cases
+        if snapshots is not None:
+            with instrumentation.phase("snapshot", week=week + 1):
+                snapshots.record(states)
+
+        record = {
+            "week": week + 1,
+            "new_cases": new_cases,
+            "cumulative_cases": cumulative_cases,
+            "deaths": deaths,
+        }
+        record.update(zip(COMPARTMENTS, frontier.counts.tolist()))
+        if track_communities:
+            # Per-community series, one entry per community
+            record["community_cumulative_cases"] = frontier.community_cases.copy()
+            record["community_deaths"] = frontier.community_deaths.copy()
+            record["community_counts"] = frontier.community_counts.copy()
+        yield record
+        if stop_when is not None and stop_when(record):
+            return
+
+
+def get_status_history_csr(
+    G: nx.Graph,
+    initial_infection_status_dict,
+    initial_infected: list,
+    total_weeks: int,
+    graph: Optional[CSRGraph] = None,
+    rng: Optional[np.random.Generator] = None,
+    snapshot_path: Optional[str] = None,
+    record_snapshots: bool = True,
+    params: EpidemicParameters = DEFAULT_PARAMETERS,
+):
+    if graph is None:
+        graph = graph_to_csr(G)
+    initial_states = states_from_dict(graph.num_nodes, initial_infection_status_dict)
+    snapshots = SnapshotStore(initial_states) if record_snapshots else None
+
+    weekly_data = {
+        "new_cases": [],
+        "cumulative_cases": [],
+        "deaths": [],
+        "infection_status_dict_snapshots": snapshots,
+        "community_cumulative_cases": [],
+        "community_deaths": [],
+        "community_counts": [],
+    }
+    for record in iter_status_history(
+        graph,
+        initial_states,
+        initial_infected,
+        total_weeks,
+        rng=rng,
+        params=params,
+        snapshots=snapshots,
+        track_communities=True,
+    ):
+        for series in weekly_data:
+            if series in record:
+                weekly_data[series].append(record[series])
+
+    if snapshots is not None and snapshot_path is not None:
+        snapshots.spill(snapshot_path)
+    return weekly_data
@@ -0,0 +1,67 @@
+import os
+from multiprocessing import Pool
+from typing import Optional, Tuple
+import numpy as np
+from constants import DEFAULT_PARAMETERS, EpidemicParameters
+from csr_engine import get_initial_states, get_status_history_csr
+from graph_cache import init_graph_worker, worker_graph
+
+WEEKLY_SERIES = ("new_cases", "cumulative_cases", "deaths")
+
+
+def _run_replicate(task) -> np.ndarray:
+    seed_sequence, total_weeks, num_initial_infections, params = task
+    rng = np.random.default_rng(seed_sequence)
+    initial_states, initial_infected = get_initial_states(
+        worker_graph(), num_initial_infections, rng
+    )
+    weekly_data = get_status_history_csr(
+        None,
+        initial_states,
+        initial_infected,
+        total_weeks,
+        graph=worker_graph(),
+        rng=rng,
+        record_snapshots=False,
+        params=params,
+    )
+    return np.array([weekly_data[series] for series in WEEKLY_SERIES])
+
+
+# Run independent replicates over one cached graph in a process pool
+def run_ensemble(
+    graph_path: str,
+    replicates: int,
+    total_weeks: int,
+    num_initial_infections=20,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    percentiles: Tuple[float, float] = (5, 95),
+    params: EpidemicParameters = DEFAULT_PARAMETERS,
+) -> dict:
+    if workers is None:
+        workers = os.cpu_count()
+    # One independent RNG stream per replicate, reproducible for a given seed
+    seed_sequences = np.random.SeedSequence(seed).spawn(replicates)
+    tasks = [
+        (sequence, total_weeks, num_initial_infections, params)
+        for sequence in seed_sequences
+    ]
+
+    # Workers memory-map the cached graph instead of receiving it per task
+    with Pool(workers, initializer=init_graph_worker, initargs=(graph_path,)) as pool:
+        results = np.stack(pool.map(_run_replicate, tasks, chunksize=1))
+
+    ensemble = {"replicates": replicates, "percentiles": percentiles}
+    for idx, series in enumerate(WEEKLY_SERIES):
+        runs = results[:, idx, :]
+        lower, median, upper = np.percentile(
+            runs, [percentiles[0], 50, percentiles[1]], axis=0
+        )
+        ensemble[series] = {
+            "mean": runs.mean(axis=0),
+            "lower": lower,
+            "median": median,
+            "upper": upper,
+        }
+    return ensemble
@@ -0,0 +1,187 @@
+from bisect import bisect_right
+from typing import Optional
+import networkx as nx
+import numpy as np
+from constants import DEFAULT_PARAMETERS, EpidemicParameters
+from csr_engine import (
+    SUSCEPTIBLE,
+    EXPOSED,
+    INFECTED,
+    RECOVERED,
+    DEAD,
+    CSRGraph,
+    gather_edges,
+    graph_to_csr,
+    states_from_dict,
+)
+from snapshot_store import SnapshotStore
+
+# Event kinds, all stamped with the day whose end-of-day state they change
+TRANSMIT, BECOME_INFECTED, REMOVE = 0, 1, 2
+# Stand-in for "never" when a probability is zero
+NEVER = np.iinfo(np.int64).max // 2
+
+
+class RateSchedule:
+    # Piecewise-constant daily infection rate, changing on mutation weeks
+    def __init__(self, params: EpidemicParameters):
+        self.change_days = [0]
+        self.rates = [params.initial_infection_rate]
+        for week in sorted(params.mutation_weeks):
+            self.change_days.append(7 * week)
+            self.rates.append(self.rates[-1] * params.mutation_rate)
+
+    # Day of the first successful daily trial for n independent edges whose
+    # trials start on first_day, resampling (memorylessly) at every rate change
+    def first_success_days(
+        self, first_day: int, n: int, rng: np.random.Generator
+    ) -> np.ndarray:
+        segment = bisect_right(self.change_days, first_day) - 1
+        # Past the last mutation the rate is constant: one geometric draw each
+        if segment == len(self.rates) - 1 and self.rates[segment] > 0:
+            rate = min(self.rates[segment], 1.0)
+            return first_day - 1 + rng.geometric(rate, n)
+
+        days = np.full(n, NEVER, dtype=np.int64)
+        pending = np.arange(n)
+        start = first_day
+        while len(pending) and segment < len(self.rates):
+            rate = self.rates[segment]
+            end = (
+                self.change_days[segment + 1]
+                if segment + 1 < len(self.change_days)
+                else NEVER
+            )
+            if rate > 0:
+                candidate = start - 1 + rng.geometric(min(rate, 1.0), len(pending))
+                landed = candidate < end
+                days[pending[landed]] = candidate[landed]
+                pending = pending[~landed]
+            segment += 1
+            start = end
+        return days
+
+
+# Event lists of every day: new exposures (transmissions that land while the
+# target is still susceptible), nodes becoming infected, and removals. Events
+# are only ever scheduled for later days, so each day is drained in one go.
+class DayCalendar:
+    def __init__(self, total_days: int):
+        self.total_days = total_days
+        self.events = [[[], [], []] for _ in range(total_days)]
+        self.pending = 0
+
+    # File every (day, node) pair of one kind under its day; days past the end
+    # of the simulation are dropped
+    def schedule(self, kind: int, days: np.ndarray, nodes: np.ndarray):
+        kept = days < self.total_days
+        days, nodes = days[kept], nodes[kept]
+        if len(days) == 0:
+            return
+        order = np.argsort(days, kind="stable")
+        days, nodes = days[order], nodes[order]
+        starts = np.flatnonzero(np.diff(days, prepend=-1))
+        for day, group in zip(days[starts].tolist(), np.split(nodes, starts[1:])):
+            self.events[day][kind].append(group)
+        self.pending += len(nodes)
+
+    def pop(self, day: int, kind: int) -> np.ndarray:
+        groups = self.events[day][kind]
+        self.events[day][kind] = []
+        if not groups:
+            return np.empty(0, dtype=np.int64)
+        nodes = np.concatenate(groups)
+        self.pending -= len(nodes)
+        return nodes
+
+
+# Next-reaction simulation: only actual state changes are ever processed, the
+# events of a day all at once
+def get_status_history_event(
+    G: nx.Graph,
+    initial_infection_status_dict,
+    initial_infected: list,
+    total_weeks: int,
+    graph: Optional[CSRGraph] = None,
+    rng: Optional[np.random.Generator] = None,
+    params: EpidemicParameters = DEFAULT_PARAMETERS,
+    record_snapshots: bool = True,
+):
+    if graph is None:
+        graph = graph_to_csr(G)
+    if rng is None:
+        rng = np.random.default_rng()
+
+    states = states_from_dict(graph.num_nodes, initial_infection_status_dict)
+    snapshots = SnapshotStore(states) if record_snapshots else None
+    total_days = 7 * total_weeks
+    incubation_days = max(params.incubation_period, 1)
+    schedule = RateSchedule(params)
+    # Daily chance of leaving I, and the share of those exits that are deaths
+    removal_rate = params.mortality_rate + (1 - params.mortality_rate) * (
+        params.recovery_rate
+    )
+    death_share = params.mortality_rate / removal_rate if removal_rate > 0 else 0.0
+    calendar = DayCalendar(total_days)
+
+    # Nodes that became infected on `day` transmit on days day+1 .. removal day
+    def on_infected(nodes: np.ndarray, day: int):
+        if removal_rate > 0:
+            removal_days = day + rng.geometric(removal_rate, len(nodes))
+        else:
+            removal_days = np.full(len(nodes), NEVER, dtype=np.int64)
+        calendar.schedule(REMOVE, removal_days, nodes)
+        _, neighbors = gather_edges(graph, nodes)
+        degrees = graph.indptr[nodes + 1] - graph.indptr[nodes]
+        susceptible = states[neighbors] == SUSCEPTIBLE
+        neighbors = neighbors[susceptible]
+        source_removal_days = np.repeat(removal_days, degrees)[susceptible]
+        transmit_days = schedule.first_success_days(day + 1, len(neighbors), rng)
+        landed = transmit_days <= source_removal_days
+        calendar.schedule(TRANSMIT, transmit_days[landed], neighbors[landed])
+
+    # Initial exposures count as exposed the day before the simulation starts
+    exposed = np.flatnonzero(states == EXPOSED)
+    calendar.schedule(
+        BECOME_INFECTED, np.full(len(exposed), incubation_days - 1), exposed
+    )
+    on_infected(np.flatnonzero(states == INFECTED), -1)
+
+    new_cases = np.zeros(total_weeks, dtype=np.int64)
+    deaths = np.zeros(total_weeks, dtype=np.int64)
+    changed = []
+    for day in range(total_days):
+        week = day // 7
+        if calendar.pending:
+            # Transmissions first: a target exposed twice the same day, or no
+            # longer susceptible, is exposed at most once
+            targets = np.unique(calendar.pop(day, TRANSMIT))
+            targets = targets[states[targets] == SUSCEPTIBLE]
+            states[targets] = EXPOSED
+            calendar.schedule(
+                BECOME_INFECTED, np.full(len(targets), day + incubation_days), targets
+            )
+
+            infected = calendar.pop(day, BECOME_INFECTED)
+            states[infected] = INFECTED
+            new_cases[week] += len(infected)
+            on_infected(infected, day)
+
+            removed = calendar.pop(day, REMOVE)
+            died = rng.random(len(removed)) < death_share
+            states[removed[died]] = DEAD
+            states[removed[~died]] = RECOVERED
+            deaths[week] += int(died.sum())
+            changed.extend([targets, infected, removed])
+
+        if snapshots is not None and day % 7 == 6:
+            node_ids = np.concatenate(changed) if changed else np.empty(0, np.int64)
+            snapshots.record_delta(node_ids, states[node_ids])
+            changed = []
+
+    return {
+        "new_cases": new_cases.tolist(),
+        "cumulative_cases": (len(initial_infected) + np.cumsum(new_cases)).tolist(),
+        "deaths": deaths.tolist(),
+        "infection_status_dict_snapshots": snapshots,
+    }
@@ -0,0 +1,132 @@
+from typing import List, Optional, Sequence, Union
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from model_cache import WARM_EPOCHS, load_or_train_model
+
+# Days of history the sequence model sees to predict the next day
+WINDOW = 28
+BATCH_SIZE = 256
+
+
+# Per-province scale so every series is trained on roughly [0, 1]
+def series_scale(cases: np.ndarray) -> np.ndarray:
+    return np.maximum(cases.max(axis=1, keepdims=True), 1.0).astype(np.float32)
+
+
+# Sliding (window -> next day) pairs over every province's scaled series,
+# framed in one vectorized op and cached, shuffled, batched and prefetched
+def make_window_dataset(
+    cases: np.ndarray,
+    window: int = WINDOW,
+    batch_size: int = BATCH_SIZE,
+    shuffle: bool = True,
+    seed: Optional[int] = None,
+    scale: Optional[np.ndarray] = None,
+) -> tf.data.Dataset:
+    if scale is None:
+        scale = series_scale(cases)
+    scaled = cases / scale
+    # (provinces, windows, window + 1), then every window as one example
+    frames = tf.signal.frame(scaled, window + 1, 1, axis=1)
+    frames = tf.reshape(frames, (-1, window + 1))
+    dataset = tf.data.Dataset.from_tensor_slices(frames)
+    dataset = dataset.map(
+        lambda frame: (frame[:window, None], frame[window:]),
+        num_parallel_calls=tf.data.AUTOTUNE,
+    ).cache()
+    if shuffle:
+        dataset = dataset.shuffle(int(frames.shape[0]), seed=seed)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def create_sequence_model(window: int = WINDOW):
+    model = tf.keras.models.Sequential()
+    model.add(tf.keras.layers.Input(shape=(window, 1)))
+    model.add(tf.keras.layers.LSTM(64))
+    model.add(tf.keras.layers.Dense(32, activation="relu"))
+    model.add(tf.keras.layers.Dense(1, activation="linear"))
+    model.compile(optimizer="adam", loss="mean_squared_error")
+    return model
+
+
+# Sequence model trained on the windows of every province at once
+class Forecaster:
+    def __init__(self, provinces: List[str], cases: np.ndarray, window: int = WINDOW):
+        if cases.shape[1] <= window:
+            raise ValueError(
+                f"Need more than {window} days of data, got {cases.shape[1]}"
+            )
+        self.provinces = list(provinces)
+        self.cases = np.asarray(cases, dtype=np.float32)
+        self.scale = series_scale(self.cases)
+        self.window = window
+        self.model = create_sequence_model(window)
+
+    # Train on the windows from start_day on, scaled like the full series
+    def fit(
+        self,
+        epochs: int = 20,
+        seed: Optional[int] = None,
+        verbose: int = 0,
+        start_day: int = 0,
+    ):
+        dataset = make_window_dataset(
+            self.cases[:, start_day:], self.window, seed=seed, scale=self.scale
+        )
+        return self.model.fit(dataset, epochs=epochs, shuffle=False, verbose=verbose)
+
+    # Fit through the model cache: reuse, warm-start or train from scratch
+    def fit_cached(
+        self,
+        epochs: int = 20,
+        warm_epochs: int = WARM_EPOCHS,
+        rebuild: bool = False,
+    ) -> str:
+        self.model, status = load_or_train_model(
+            lambda: self.model,
+            lambda model, start_day, epochs: self.fit(epochs, start_day=start_day),
+            self.cases,
+            {"model": "forecaster", "window": self.window, "epochs": epochs},
+            epochs,
+            warm_epochs=warm_epochs,
+            # Windows ending in the new days start `window` days earlier
+            overlap=self.window,
+            rebuild=rebuild,
+            # The weights expect inputs scaled like the series they were
+            # trained on, so a warm start keeps the cached scale
+            save_state=lambda: {"scale": self.scale[:, 0].tolist()},
+            load_state=self._load_scale,
+        )
+        return status
+
+    def _load_scale(self, state: dict):
+        self.scale = np.asarray(state["scale"], dtype=np.float32)[:, None]
+
+    # Cases for `horizon` days past the end of the data for every requested
+    # province, rolled forward together so each day is one batched model call;
+    # a sequence of horizons returns just those days
+    def forecast(
+        self,
+        provinces: Union[str, Sequence[str]],
+        horizon: Union[int, Sequence[int]],
+    ) -> pd.DataFrame:
+        if isinstance(provinces, str):
+            provinces = [provinces]
+        horizons = [horizon] if np.isscalar(horizon) else list(horizon)
+        rows = [self.provinces.index(province) for province in provinces]
+        scale = self.scale[rows]
+
+        history = self.cases[rows, -self.window :] / scale
+        predictions = np.empty((len(rows), max(horizons)), dtype=np.float32)
+        for day in range(max(horizons)):
+            step = self.model(history[:, :, None], training=False).numpy()
+            predictions[:, day] = step[:, 0]
+            history = np.concatenate([history[:, 1:], step], axis=1)
+
+        columns = range(1, max(horizons) + 1) if np.isscalar(horizon) else horizons
+        return pd.DataFrame(
+            predictions[:, [day - 1 for day in columns]] * scale,
+            index=pd.Index(provinces, name="Province"),
+            columns=pd.Index(list(columns), name="Days ahead"),
+        )
@@ -0,0 +1,240 @@
+import os
+import shutil
+import tempfile
+from typing import Optional, Tuple
+import networkx as nx
+import numpy as np
+from constants import VAN_POPULATION_DENSITY_REDUCED, INTER_REGION_CONNECTIONS
+from csr_engine import CSRGraph
+
+# New Barabási-Albert nodes are drawn in batches of 1/BATCH_DIVISOR of the
+# nodes already in the graph, and of at least MIN_BATCH nodes
+BATCH_DIVISOR = 256
+MIN_BATCH = 256
+
+
+def barabasi_albert_edge_count(n: int, m: int) -> int:
+    # Star graph on m + 1 nodes, then m edges for every further node
+    return m + (n - m - 1) * m
+
+
+# Entries of the growth list of nx.barabasi_albert_graph, which holds every
+# node once per incident edge: m zeros and the nodes 1..m for the star, then
+# for every further node its m targets followed by m copies of itself
+def _growth_list_entries(
+    positions: np.ndarray, m: int, targets: np.ndarray
+) -> np.ndarray:
+    block, offset = np.divmod(np.maximum(positions - 2 * m, 0), 2 * m)
+    own_entry = block + m + 1
+    target_entry = targets[m + block * m + np.minimum(offset, m - 1)]
+    star_entry = np.where(positions < m, 0, positions - m + 1)
+    return np.where(
+        positions < 2 * m, star_entry, np.where(offset < m, target_entry, own_entry)
+    )
+
+
+def _growth_list_entry(position: int, m: int, targets: np.ndarray) -> int:
+    if position < 2 * m:
+        return 0 if position < m else position - m + 1
+    block, offset = divmod(position - 2 * m, 2 * m)
+    return block + m + 1 if offset >= m else int(targets[m + block * m + offset])
+
+
+# Barabási-Albert targets written straight into a slice of the global edge list
+def fill_barabasi_albert_targets(
+    n: int, m: int, rng: np.random.Generator, targets: np.ndarray
+):
+    # Same growth process as nx.barabasi_albert_graph: new nodes pick m
+    # distinct uniform entries of the growth list. A batch of new nodes draws
+    # its first m positions each at once; only nodes that hit the targets of
+    # another node in the same batch, or the same node twice, are resolved
+    # one by one, in order, once the nodes before them are known
+    targets[:m] = np.arange(1, m + 1)
+    first = m + 1
+    while first < n:
+        last = min(n, first + max(MIN_BATCH, first // BATCH_DIVISOR))
+        lengths = 2 * m * (np.arange(first, last) - m)
+        positions = (rng.random((last - first, m)) * lengths[:, None]).astype(np.int64)
+        batch_targets = targets[m + (first - m - 1) * m : m + (last - m - 1) * m]
+        batch_targets = batch_targets.reshape(-1, m)
+
+        block, offset = np.divmod(positions - 2 * m, 2 * m)
+        in_batch = (positions >= 2 * m) & (offset < m) & (block + m + 1 >= first)
+        entries = np.sort(_growth_list_entries(positions, m, targets), axis=1)
+        repeated = (entries[:, 1:] == entries[:, :-1]).any(axis=1)
+        one_by_one = in_batch.any(axis=1) | repeated
+        batch_targets[~one_by_one] = entries[~one_by_one]
+
+        for row in np.flatnonzero(one_by_one).tolist():
+            draws = positions[row].tolist()
+            chosen = []
+            while len(chosen) < m:
+                if draws:
+                    position = draws.pop(0)
+                else:
+                    position = int(rng.random() * lengths[row])
+                node = _growth_list_entry(position, m, targets)
+                if node not in chosen:
+                    chosen.append(node)
+            batch_targets[row] = chosen
+        first = last
+
+
+def barabasi_albert_sources(n: int, m: int) -> np.ndarray:
+    return np.concatenate(
+        [np.zeros(m, dtype=np.int64), np.repeat(np.arange(m + 1, n), m)]
+    )
+
+
+# Edges between consecutive communities, sampled in one batch per pair
+def inter_region_edges(
+    community_offsets: np.ndarray,
+    inter_region_connections: int,
+    rng: np.random.Generator,
+) -> Tuple[np.ndarray, np.ndarray]:
+    starts = community_offsets[:-1]
+    sizes = np.diff(community_offsets)
+    pairs = len(sizes) - 1
+    if pairs <= 0 or inter_region_connections <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pair_index = np.repeat(np.arange(pairs), inter_region_connections)
+    node_a = starts[pair_index] + (
+        rng.random(len(pair_index)) * sizes[pair_index]
+    ).astype(np.int64)
+    node_b = starts[pair_index + 1] + (
+        rng.random(len(pair_index)) * sizes[pair_index + 1]
+    ).astype(np.int64)
+    # Repeated picks of the same pair collapse into one edge, as in nx.Graph
+    keys = np.unique(node_a * community_offsets[-1] + node_b)
+    return keys // community_offsets[-1], keys % community_offsets[-1]
+
+
+# Bytes of the finished CSR arrays, and the peak working memory of building
+# the largest community (edge arrays and sort order)
+def community_csr_bytes(density_list, inter_region_connections) -> Tuple[int, int]:
+    edge_counts = [
+        barabasi_albert_edge_count(city["population"], city["density"])
+        for city in density_list
+    ]
+    num_nodes = sum(city["population"] for city in density_list)
+    num_edges = sum(edge_counts) + inter_region_connections * (len(density_list) - 1)
+    graph_bytes = 8 * (num_nodes + 1) + 4 * 2 * num_edges + 4 * sum(edge_counts)
+    return graph_bytes, 2 * max(edge_counts) * 6 * 8
+
+
+def _new_array(out_dir: Optional[str], name: str, length: int, dtype) -> np.ndarray:
+    if out_dir is None:
+        return np.empty(length, dtype=dtype)
+    return np.lib.format.open_memmap(
+        os.path.join(out_dir, f"{name}.npy"),
+        mode="w+",
+        dtype=dtype,
+        shape=(int(length),),
+    )
+
+
+# Community graph built one community at a time. The Barabási-Albert targets
+# are drawn first (sources are implicit), then each community's CSR rows are
+# written with its inter-region edges, so only one community's edge list is
+# ever expanded. With out_dir the arrays are .npy memmaps in that directory;
+# without it they are memmapped to a temporary directory, unlinked again before
+# returning, once the graph would not fit in memory_budget bytes.
+def build_community_csr(
+    density_list=VAN_POPULATION_DENSITY_REDUCED,
+    inter_region_connections=INTER_REGION_CONNECTIONS["Vancouver"],
+    seed: Optional[int] = None,
+    out_dir: Optional[str] = None,
+    memory_budget: Optional[int] = None,
+) -> CSRGraph:
+    rng = np.random.default_rng(seed)
+    populations = np.array([city["population"] for city in density_list])
+    densities = np.array([city["density"] for city in density_list])
+    community_offsets = np.zeros(len(density_list) + 1, dtype=np.int64)
+    np.cumsum(populations, out=community_offsets[1:])
+    edge_counts = [
+        barabasi_albert_edge_count(n, m) for n, m in zip(populations, densities)
+    ]
+    edge_offsets = np.zeros(len(density_list) + 1, dtype=np.int64)
+    np.cumsum(edge_counts, out=edge_offsets[1:])
+    num_nodes = int(community_offsets[-1])
+
+    if memory_budget is not None:
+        graph_bytes, working_bytes = community_csr_bytes(
+            density_list, inter_region_connections
+        )
+        if working_bytes > memory_budget:
+            raise MemoryError(
+                f"Building the largest community needs about {working_bytes >> 20} "
+                f"MB, over the {memory_budget >> 20} MB memory budget"
+            )
+        if out_dir is None and graph_bytes + working_bytes > memory_budget:
+            temporary_dir = tempfile.mkdtemp(prefix="graph_")
+            try:
+                return build_community_csr(
+                    density_list, inter_region_connections, seed, temporary_dir
+                )
+            finally:
+                # The returned memmaps stay valid once their files are
+                # unlinked; the disk space is freed when the graph is released
+                shutil.rmtree(temporary_dir, ignore_errors=True)
+
+    # Community-local targets of every Barabási-Albert edge, in generation order
+    local_targets = _new_array(out_dir, "ba_targets", edge_offsets[-1], np.int32)
+    for idx, (n, m) in enumerate(zip(populations, densities)):
+        start, end = edge_offsets[idx], edge_offsets[idx + 1]
+        fill_barabasi_albert_targets(n, m, rng, local_targets[start:end])
+
+    inter_sources, inter_targets = inter_region_edges(
+        community_offsets, inter_region_connections, rng
+    )
+    inter_communities = (
+        np.searchsorted(community_offsets, inter_sources, side="right") - 1,
+        np.searchsorted(community_offsets, inter_targets, side="right") - 1,
+    )
+
+    indptr = _new_array(out_dir, "indptr", num_nodes + 1, np.int64)
+    indices = _new_array(
+        out_dir, "indices", 2 * (edge_offsets[-1] + len(inter_sources)), np.int32
+    )
+    indptr[0] = 0
+    for idx, (n, m) in enumerate(zip(populations, densities)):
+        start, end = community_offsets[idx], community_offsets[idx + 1]
+        touching = (inter_communities[0] == idx) | (inter_communities[1] == idx)
+        sources = np.concatenate(
+            [barabasi_albert_sources(n, m) + start, inter_sources[touching]]
+        )
+        targets = np.concatenate(
+            [
+                local_targets[edge_offsets[idx] : edge_offsets[idx + 1]] + start,
+                inter_targets[touching],
+            ]
+        )
+        # Both directions of every edge, keeping the rows of this community;
+        # the stable sort keeps the neighbor order of one global edge list
+        both_sources = np.concatenate([sources, targets])
+        both_targets = np.concatenate([targets, sources])
+        inside = (both_sources >= start) & (both_sources < end)
+        both_sources, both_targets = both_sources[inside], both_targets[inside]
+        order = np.argsort(both_sources, kind="stable")
+        row_start = indptr[start]
+        indptr[start + 1 : end + 1] = row_start + np.cumsum(
+            np.bincount(both_sources - start, minlength=n)
+        )
+        indices[row_start : row_start + len(order)] = both_targets[order]
+
+    if out_dir is not None:
+        np.save(os.path.join(out_dir, "community_offsets.npy"), community_offsets)
+        indptr.flush()
+        indices.flush()
+        del local_targets
+        os.remove(os.path.join(out_dir, "ba_targets.npy"))
+    return CSRGraph(indptr, indices, community_offsets)
+
+
+def csr_to_networkx(graph: CSRGraph) -> nx.Graph:
+    G = nx.Graph()
+    G.add_nodes_from(range(graph.num_nodes))
+    sources = np.repeat(np.arange(graph.num_nodes), np.diff(graph.indptr))
+    upper = sources < graph.indices
+    G.add_edges_from(zip(sources[upper].tolist(), graph.indices[upper].tolist()))
+    return G
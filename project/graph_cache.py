@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Optional
+import numpy as np
+from csr_engine import CSRGraph
+from graph_builder import build_community_csr
+from cache_paths import CACHE_DIR
+from layout import compute_layout
+
+# Bump when the generator or the file layout changes
+CACHE_VERSION = 2
+GRAPH_ARRAYS = ("indptr", "indices", "community_offsets")
+
+
+def graph_cache_key(density_list, inter_region_connections, seed) -> str:
+    payload = json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "density_list": [
+                [city["name"], city["population"], city["density"]]
+                for city in density_list
+            ],
+            "inter_region_connections": inter_region_connections,
+            "seed": seed,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def graph_cache_path(
+    density_list, inter_region_connections, seed, cache_dir: str = CACHE_DIR
+) -> str:
+    key = graph_cache_key(density_list, inter_region_connections, seed)
+    return os.path.join(cache_dir, "graphs", key)
+
+
+def load_graph(path: str, mmap_mode: Optional[str] = "r") -> CSRGraph:
+    return CSRGraph(
+        *(
+            np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in GRAPH_ARRAYS
+        )
+    )
+
+
+# Graph of the current pool worker, memory-mapped once by init_graph_worker;
+# pass that as the Pool initializer with the graph path as its argument
+_worker_graph = None
+
+
+def init_graph_worker(graph_path: str):
+    global _worker_graph
+    _worker_graph = load_graph(graph_path)
+
+
+def worker_graph() -> CSRGraph:
+    return _worker_graph
+
+
+# Load a generated community graph from the cache, building it on a miss
+def load_or_build_community_csr(
+    density_list,
+    inter_region_connections,
+    seed: Optional[int] = 0,
+    rebuild: bool = False,
+    cache_dir: str = CACHE_DIR,
+    memory_budget: Optional[int] = None,
+) -> CSRGraph:
+    # Unseeded graphs are different on every run, so there is nothing to reuse
+    if seed is None:
+        return build_community_csr(
+            density_list, inter_region_connections, seed, memory_budget=memory_budget
+        )
+
+    path = graph_cache_path(density_list, inter_region_connections, seed, cache_dir)
+    if rebuild and os.path.isdir(path):
+        shutil.rmtree(path)
+    if not os.path.isdir(path):
+        # Generate straight into memory-mapped files of a temporary directory,
+        # so the graph never has to fit in memory, then move it into place
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=parent)
+        try:
+            build_community_csr(
+                density_list,
+                inter_region_connections,
+                seed,
+                out_dir=tmp_path,
+                memory_budget=memory_budget,
+            )
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process cached the same graph first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return load_graph(path)
+
+
+# Node positions for the dot graph, cached next to the graph they belong to
+def load_or_compute_layout(path: str, graph: CSRGraph) -> np.ndarray:
+    layout_file = os.path.join(path, "layout.npy")
+    if os.path.exists(layout_file):
+        return np.load(layout_file)
+    positions = compute_layout(graph)
+    if os.path.isdir(path):
+        np.save(layout_file, positions)
+    return positions
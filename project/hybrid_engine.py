@@ -0,0 +1,251 @@
+from typing import Optional, Sequence
+import numpy as np
+from constants import DEFAULT_PARAMETERS, EpidemicParameters
+from csr_engine import (
+    SUSCEPTIBLE,
+    EXPOSED,
+    INFECTED,
+    RECOVERED,
+    DEAD,
+    FrontierState,
+    simulate_day_csr,
+)
+from graph_builder import build_community_csr
+
+# A compartmental community switches to the node-level network once its
+# cumulative cases reach this many
+PROMOTE_AT_CASES = 1000
+# Communities are only promoted while the node-level ones stay under this size
+MAX_AGENT_NODES = 2_000_000
+
+
+# One community simulated node by node on its own Barabási-Albert graph
+class _AgentCommunity:
+    def __init__(self, graph, frontier: FrontierState):
+        self.graph = graph
+        self.frontier = frontier
+
+
+# Every inter-region edge between consecutive communities, as (community,
+# local node) endpoints, sampled like graph_builder.inter_region_edges
+def _inter_region_endpoints(
+    populations: np.ndarray, inter_region_connections: int, rng: np.random.Generator
+):
+    pairs = len(populations) - 1
+    if pairs <= 0 or inter_region_connections <= 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    community_a = np.repeat(np.arange(pairs), inter_region_connections)
+    community_b = community_a + 1
+    node_a = (rng.random(len(community_a)) * populations[community_a]).astype(np.int64)
+    node_b = (rng.random(len(community_b)) * populations[community_b]).astype(np.int64)
+    # Repeated picks of the same pair collapse into one edge
+    keys = np.unique(
+        np.stack([community_a, node_a, node_b]).T, axis=0, return_index=True
+    )[1]
+    keys.sort()
+    return community_a[keys], node_a[keys], community_b[keys], node_b[keys]
+
+
+# Hybrid metapopulation simulation: communities run as stochastic SEIR
+# compartments (binomial draws on counts, random mixing over the mean
+# Barabási-Albert degree 2m) until they become hot spots, then on their own
+# node-level graph. Communities are coupled only through the inter-region
+# edges, whose endpoints are real nodes in node-level communities and drawn
+# from the compartment shares elsewhere.
+def get_status_history_hybrid(
+    density_list,
+    inter_region_connections: int,
+    num_initial_infections: int,
+    total_weeks: int,
+    rng: Optional[np.random.Generator] = None,
+    params: EpidemicParameters = DEFAULT_PARAMETERS,
+    agent_communities: Sequence[str] = (),
+    promote_at: Optional[int] = PROMOTE_AT_CASES,
+    max_agent_nodes: int = MAX_AGENT_NODES,
+):
+    if rng is None:
+        rng = np.random.default_rng()
+
+    names = [city["name"] for city in density_list]
+    populations = np.array([city["population"] for city in density_list])
+    densities = np.array([city["density"] for city in density_list])
+    num_communities = len(density_list)
+    incubation_days = max(params.incubation_period, 1)
+
+    # Compartment counts; exposed counts sit in a ring indexed like
+    # FrontierState.incubating (exposed on day d -> slot d % incubation_days)
+    susceptible = populations.astype(np.int64)
+    incubating = np.zeros((num_communities, incubation_days), dtype=np.int64)
+    infected = np.zeros(num_communities, dtype=np.int64)
+    recovered = np.zeros(num_communities, dtype=np.int64)
+    dead = np.zeros(num_communities, dtype=np.int64)
+    community_cases = np.zeros(num_communities, dtype=np.int64)
+    community_deaths = np.zeros(num_communities, dtype=np.int64)
+
+    # Initial exposures, uniformly over every person in the region, count as
+    # exposed the day before the simulation starts
+    initial = rng.multivariate_hypergeometric(populations, num_initial_infections)
+    susceptible -= initial
+    incubating[:, -1] = initial
+    community_cases += initial
+
+    edges = _inter_region_endpoints(populations, inter_region_connections, rng)
+    agents = {}
+
+    def promote(community: int, day: int):
+        n = int(populations[community])
+        graph = build_community_csr(
+            [density_list[community]], 0, seed=int(rng.integers(2**63))
+        )
+        # Spread the current counts over the nodes at random
+        codes = np.repeat(
+            [SUSCEPTIBLE, INFECTED, RECOVERED, DEAD],
+            [
+                susceptible[community],
+                infected[community],
+                recovered[community],
+                dead[community],
+            ],
+        )
+        slots = np.repeat(np.arange(incubation_days), incubating[community])
+        nodes = rng.permutation(n)
+        states = np.empty(n, dtype=np.uint8)
+        states[nodes[: len(codes)]] = codes
+        exposed_nodes = nodes[len(codes) :]
+        states[exposed_nodes] = EXPOSED
+        frontier = FrontierState(states, params.incubation_period)
+        frontier.incubating = [
+            np.sort(exposed_nodes[slots == slot]) for slot in range(incubation_days)
+        ]
+        frontier.day = day
+        agents[community] = _AgentCommunity(graph, frontier)
+        susceptible[community] = infected[community] = 0
+        recovered[community] = dead[community] = 0
+        incubating[community] = 0
+
+    def agent_nodes() -> int:
+        return int(sum(populations[community] for community in agents))
+
+    for name in agent_communities:
+        promote(names.index(name), 0)
+
+    def community_counts() -> np.ndarray:
+        counts = np.column_stack(
+            [susceptible, incubating.sum(axis=1), infected, recovered, dead]
+        )
+        for community, agent in agents.items():
+            counts[community] = agent.frontier.counts
+        return counts
+
+    # Each inter-region endpoint's state: the real node's state in node-level
+    # communities, a draw from the compartment shares elsewhere
+    def endpoint_states(communities: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        counts = community_counts()
+        shares = np.cumsum(counts, axis=1) / populations[:, None]
+        draws = rng.random(len(communities))
+        states = (draws[:, None] >= shares[communities]).sum(axis=1)
+        states = np.minimum(states, DEAD).astype(np.uint8)
+        for community, agent in agents.items():
+            here = communities == community
+            states[here] = agent.frontier.states[nodes[here]]
+        return states
+
+    weekly_data = {
+        "new_cases": [],
+        "cumulative_cases": [],
+        "deaths": [],
+        "infection_status_dict_snapshots": None,
+        "community_cumulative_cases": [],
+        "community_deaths": [],
+        "community_counts": [],
+        "agent_communities": [],
+    }
+    cumulative_cases = num_initial_infections
+    infection_rate = params.initial_infection_rate
+
+    for week in range(total_weeks):
+        # Mutation Effect
+        if week in params.mutation_weeks:
+            infection_rate *= params.mutation_rate
+        new_cases = 0
+        deaths = 0
+
+        for day_of_week in range(7):  # Simulate 7 days per week
+            day = 7 * week + day_of_week
+            slot = day % incubation_days
+
+            # Transmission along inter-region edges, from start-of-day states
+            community_a, node_a, community_b, node_b = edges
+            states_a = endpoint_states(community_a, node_a)
+            states_b = endpoint_states(community_b, node_b)
+            hits = rng.random(len(community_a)) < infection_rate
+            forward = hits & (states_a == INFECTED) & (states_b == SUSCEPTIBLE)
+            backward = hits & (states_b == INFECTED) & (states_a == SUSCEPTIBLE)
+            target_communities = np.concatenate(
+                [community_b[forward], community_a[backward]]
+            )
+            target_nodes = np.concatenate([node_b[forward], node_a[backward]])
+
+            # Compartment step: binomial transitions on every community's counts
+            mean_degree = 2 * densities
+            contact = np.clip(infection_rate * infected / populations, 0, 1)
+            exposure = 1 - (1 - contact) ** mean_degree
+            newly_exposed = rng.binomial(susceptible, exposure)
+            matured = incubating[:, slot].copy()
+            died = rng.binomial(infected, params.mortality_rate)
+            removed = rng.binomial(infected - died, params.recovery_rate)
+            cross = np.bincount(target_communities, minlength=num_communities)
+            for community in agents:
+                cross[community] = 0
+            newly_exposed += np.minimum(cross, susceptible - newly_exposed)
+            susceptible -= newly_exposed
+            incubating[:, slot] = newly_exposed
+            infected += matured - died - removed
+            recovered += removed
+            dead += died
+            community_cases += matured
+            community_deaths += died
+            new_cases += int(matured.sum())
+            deaths += int(died.sum())
+
+            # Node-level step of every hot spot, then its inter-region exposures
+            for community, agent in agents.items():
+                frontier = agent.frontier
+                day_cases, day_deaths = simulate_day_csr(
+                    agent.graph, frontier, infection_rate, rng, params
+                )
+                community_cases[community] += day_cases
+                community_deaths[community] += day_deaths
+                new_cases += day_cases
+                deaths += day_deaths
+                exposed = np.unique(target_nodes[target_communities == community])
+                exposed = exposed[frontier.states[exposed] == SUSCEPTIBLE]
+                frontier.states[exposed] = EXPOSED
+                frontier.counts[SUSCEPTIBLE] -= len(exposed)
+                frontier.counts[EXPOSED] += len(exposed)
+                bucket = (frontier.day - 1) % frontier.incubation_days
+                frontier.incubating[bucket] = np.concatenate(
+                    [frontier.incubating[bucket], exposed]
+                )
+
+        # Hot spots move to the node-level network, largest outbreak first
+        if promote_at is not None:
+            for community in np.argsort(-community_cases):
+                if community in agents or community_cases[community] < promote_at:
+                    continue
+                if agent_nodes() + populations[community] > max_agent_nodes:
+                    continue
+                promote(int(community), 7 * (week + 1))
+
+        cumulative_cases += new_cases
+        weekly_data["new_cases"].append(new_cases)
+        weekly_data["cumulative_cases"].append(cumulative_cases)
+        weekly_data["deaths"].append(deaths)
+        weekly_data["community_cumulative_cases"].append(community_cases.copy())
+        weekly_data["community_deaths"].append(community_deaths.copy())
+        weekly_data["community_counts"].append(community_counts())
+        weekly_data["agent_communities"].append(
+            [names[community] for community in sorted(agents)]
+        )
+    return weekly_data
@@ -0,0 +1,161 @@
+import cProfile
+import csv
+import json
+import os
+import pstats
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+PROFILE_HOOKS = ("cprofile", "pyinstrument")
+# Shared by every disabled phase, so a disabled timer costs one call
+_DISABLED = nullcontext()
+
+
+# Per-phase timers and per-day counters of one run. Everything is a no-op
+# until enable() is called, so the engines can report unconditionally.
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.hook = None
+        self.reset()
+
+    def reset(self):
+        self.phases = []
+        self.days = []
+        self._origin = time.perf_counter()
+
+    def enable(self, hook: Optional[str] = None):
+        if hook is not None and hook not in PROFILE_HOOKS:
+            raise ValueError(f"Unknown profile hook {hook}")
+        self.enabled = True
+        self.hook = hook
+        self.reset()
+
+    # Time a block as one phase, e.g. phase("step", week=3)
+    def phase(self, name: str, **labels):
+        if not self.enabled:
+            return _DISABLED
+        return self._timed(name, labels)
+
+    @contextmanager
+    def _timed(self, name: str, labels: dict):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append(
+                {
+                    "name": name,
+                    **labels,
+                    "start": start - self._origin,
+                    "seconds": time.perf_counter() - start,
+                }
+            )
+
+    # Counters of one simulated day (nodes scanned, edges examined, ...)
+    def record_day(self, **counters):
+        if self.enabled:
+            self.days.append({"day": len(self.days), **counters})
+
+    # Run the block under cProfile or pyinstrument when a hook was asked for,
+    # writing the profile next to the trace
+    @contextmanager
+    def profiled(self, trace_path: Optional[str]):
+        if not self.enabled or self.hook is None:
+            yield
+            return
+        stem = os.path.splitext(trace_path)[0]
+        if self.hook == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(f"{stem}.prof")
+                pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+            return
+
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(f"{stem}.html", "w") as f:
+                f.write(profiler.output_html())
+            print(profiler.output_text())
+
+    # Total seconds and count of every phase name, in first-seen order
+    def phase_totals(self) -> dict:
+        totals = {}
+        for phase in self.phases:
+            total = totals.setdefault(phase["name"], {"seconds": 0.0, "count": 0})
+            total["seconds"] += phase["seconds"]
+            total["count"] += 1
+        return totals
+
+    def counter_totals(self) -> dict:
+        totals = {}
+        for day in self.days:
+            for name, value in day.items():
+                if name != "day":
+                    totals[name] = totals.get(name, 0) + value
+        return totals
+
+    # JSON trace, or one CSV row per phase and per day counter for .csv paths
+    def write_trace(self, path: str):
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["kind", "name", "week", "day", "start", "value"])
+                for phase in self.phases:
+                    writer.writerow(
+                        [
+                            "phase",
+                            phase["name"],
+                            phase.get("week", ""),
+                            "",
+                            f"{phase['start']:.6f}",
+                            f"{phase['seconds']:.6f}",
+                        ]
+                    )
+                for day in self.days:
+                    for name, value in day.items():
+                        if name != "day":
+                            writer.writerow(
+                                [
+                                    "counter",
+                                    name,
+                                    day["day"] // 7 + 1,
+                                    day["day"],
+                                    "",
+                                    value,
+                                ]
+                            )
+            return
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "phases": self.phases,
+                    "days": self.days,
+                    "phase_totals": self.phase_totals(),
+                    "counter_totals": self.counter_totals(),
+                },
+                f,
+                indent=2,
+            )
+
+    def print_summary(self):
+        print("Profile summary:")
+        for name, total in self.phase_totals().items():
+            print(f"  {name:<12}{total['seconds']:>10.3f} s  ({total['count']}x)")
+        for name, value in self.counter_totals().items():
+            print(f"  {name:<20}{value:>14}")
+
+
+# The instrumentation shared by the engines and the report script
+instrumentation = Instrumentation()
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from cache_paths import CACHE_DIR
+
+JHU_CONFIRMED_URL = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_global.csv"
+# Local copy of the CSV and the parsed matrices, so runs work without network
+JHU_CACHE_DIR = os.path.join(CACHE_DIR, "jhu")
+JHU_CSV = os.path.join(JHU_CACHE_DIR, "time_series_covid19_confirmed_global.csv")
+# Columns before the first date: Province/State, Country/Region, Lat, Long
+JHU_META_COLUMNS = 4
+
+
+# Download the CSV into the cache, replacing the previous copy only on success
+def download_confirmed_csv(csv_path: str = JHU_CSV, url: str = JHU_CONFIRMED_URL):
+    import requests
+
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(csv_path))
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(response.raw, f)
+    os.replace(tmp_path, csv_path)
+
+
+# Confirmed cases of one country as a provinces x dates float32 matrix
+def parse_confirmed_csv(
+    csv_path: str, country: str = "Canada"
+) -> Tuple[List[str], List[str], np.ndarray]:
+    frame = pd.read_csv(csv_path)
+    frame = frame[frame["Country/Region"] == country]
+    provinces = frame["Province/State"].fillna(country).tolist()
+    dates = frame.columns[JHU_META_COLUMNS:].tolist()
+    cases = frame.iloc[:, JHU_META_COLUMNS:].to_numpy(dtype=np.float32)
+    return provinces, dates, cases
+
+
+# Parsed matrices are keyed by the CSV they came from and its modification time
+def _matrix_path(csv_path: str, country: str) -> str:
+    stat = os.stat(csv_path)
+    payload = f"{os.path.abspath(csv_path)}:{stat.st_mtime_ns}:{stat.st_size}"
+    key = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(JHU_CACHE_DIR, f"{country.lower().replace(' ', '_')}-{key}")
+
+
+# Provinces, dates and the (provinces, dates) case matrix, read from the parsed
+# cache when the CSV has not changed; the CSV is only fetched when missing or
+# when refresh is asked for
+def load_confirmed_cases(
+    country: str = "Canada",
+    refresh: bool = False,
+    csv_path: Optional[str] = None,
+) -> Tuple[List[str], List[str], np.ndarray]:
+    if csv_path is None:
+        csv_path = JHU_CSV
+        if refresh or not os.path.exists(csv_path):
+            download_confirmed_csv(csv_path)
+
+    path = _matrix_path(csv_path, country)
+    if os.path.isdir(path):
+        with open(os.path.join(path, "labels.json"), "r") as f:
+            labels = json.load(f)
+        cases = np.load(os.path.join(path, "cases.npy"))
+        return labels["provinces"], labels["dates"], cases
+
+    provinces, dates, cases = parse_confirmed_csv(csv_path, country)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=os.path.dirname(path))
+    np.save(os.path.join(tmp_path, "cases.npy"), cases)
+    with open(os.path.join(tmp_path, "labels.json"), "w") as f:
+        json.dump({"provinces": provinces, "dates": dates}, f)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another run parsed the same CSV first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return provinces, dates, cases
@@ -0,0 +1,47 @@
+import networkx as nx
+import numpy as np
+from csr_engine import CSRGraph
+
+# Communities larger than this are scattered in a disc instead of spring-laid out
+MAX_SPRING_NODES = 3000
+
+
+# Positions of one community's nodes, roughly inside the unit disc
+def community_layout(
+    graph: CSRGraph, start: int, end: int, seed: int = 0
+) -> np.ndarray:
+    size = end - start
+    if size > MAX_SPRING_NODES:
+        rng = np.random.default_rng([seed, start])
+        angle = rng.random(size) * 2 * np.pi
+        radius = np.sqrt(rng.random(size))
+        return np.column_stack([radius * np.cos(angle), radius * np.sin(angle)])
+
+    community = nx.Graph()
+    community.add_nodes_from(range(size))
+    for node in range(size):
+        neighbors = graph.indices[
+            graph.indptr[start + node] : graph.indptr[start + node + 1]
+        ]
+        inside = neighbors[(neighbors >= start) & (neighbors < end)] - start
+        community.add_edges_from((node, int(other)) for other in inside)
+    local = nx.spring_layout(community, seed=seed, iterations=30)
+    return np.array([local[node] for node in range(size)])
+
+
+# Fixed node positions: communities on a grid, each laid out on its own
+def compute_layout(graph: CSRGraph, seed: int = 0) -> np.ndarray:
+    offsets = graph.community_offsets
+    if offsets is None:
+        offsets = np.array([0, graph.num_nodes])
+    sizes = np.diff(offsets)
+    columns = int(np.ceil(np.sqrt(len(sizes))))
+    # Community discs scaled by the square root of their population
+    radii = 0.45 * np.sqrt(sizes / sizes.max())
+    positions = np.empty((graph.num_nodes, 2), dtype=np.float32)
+
+    for idx, (start, end) in enumerate(zip(offsets[:-1], offsets[1:])):
+        center = np.array([idx % columns, -(idx // columns)], dtype=np.float64)
+        local = community_layout(graph, start, end, seed)
+        positions[start:end] = center + radii[idx] * local
+    return positions
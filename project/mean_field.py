@@ -0,0 +1,248 @@
+import argparse
+import time
+from typing import Optional, Sequence, Tuple, Union
+import numpy as np
+from constants import REGIONS, DEFAULT_PARAMETERS, EpidemicParameters
+from csr_engine import CSRGraph
+from parameter_sweep import parameter_grid
+
+# Degrees are grouped into this many log-spaced classes
+DEGREE_BINS = 64
+# A parameter set with fewer exposed and infected people than this is
+# extinct: it stops being stepped and its remaining weeks have no new cases
+EXTINCT_PEOPLE = 1e-3
+
+
+# Degree distribution P(k) of the generated Barabási-Albert communities,
+# pooled by population: 2m(m+1) / (k(k+1)(k+2)) for k >= m, cut off at the
+# natural maximum degree m * sqrt(n) of an n-node graph
+def barabasi_albert_degrees(density_list) -> np.ndarray:
+    k_max = max(
+        int(np.ceil(city["density"] * np.sqrt(city["population"])))
+        for city in density_list
+    )
+    k = np.arange(k_max + 1, dtype=np.float64)
+    total_population = sum(city["population"] for city in density_list)
+    pk = np.zeros(k_max + 1)
+    for city in density_list:
+        m = city["density"]
+        cutoff = int(np.ceil(m * np.sqrt(city["population"])))
+        community = np.zeros(k_max + 1)
+        degrees = k[m : cutoff + 1]
+        community[m : cutoff + 1] = (
+            2 * m * (m + 1) / (degrees * (degrees + 1) * (degrees + 2))
+        )
+        pk += community / community.sum() * city["population"] / total_population
+    return pk
+
+
+# Degree distribution P(k) of an actual CSR graph
+def graph_degrees(graph: CSRGraph) -> np.ndarray:
+    counts = np.bincount(np.diff(graph.indptr))
+    return counts / counts.sum()
+
+
+# Log-spaced degree classes: (mean degree, share of nodes) of every non-empty one
+def degree_classes(
+    pk: np.ndarray, num_bins: int = DEGREE_BINS
+) -> Tuple[np.ndarray, np.ndarray]:
+    k = np.arange(len(pk))
+    edges = np.unique(np.geomspace(1, len(pk), num_bins + 1).astype(np.int64))
+    classes = np.digitize(k, edges)
+    weights = np.bincount(classes, pk)
+    degree_sums = np.bincount(classes, k * pk)
+    occupied = weights > 0
+    return degree_sums[occupied] / weights[occupied], weights[occupied]
+
+
+# Deterministic degree-based mean-field SEIR, stepped day by day like the
+# network engines: a susceptible node of degree k is exposed with probability
+# 1 - (1 - rate * theta)^k, theta being the chance that an edge leads to an
+# infected node. With pair_approximation, each infected node's edge back to
+# whoever infected it is left out of theta, as it cannot lead to a susceptible.
+# Every parameter set in `params` is solved at once along the first array axis;
+# a single EpidemicParameters gives the weekly scalars of get_status_history,
+# a sequence gives one value per parameter set each week.
+def solve_mean_field(
+    density_list,
+    num_initial_infections: int,
+    total_weeks: int,
+    params: Union[
+        EpidemicParameters, Sequence[EpidemicParameters]
+    ] = DEFAULT_PARAMETERS,
+    pk: Optional[np.ndarray] = None,
+    pair_approximation: bool = True,
+    num_bins: int = DEGREE_BINS,
+):
+    single = isinstance(params, EpidemicParameters)
+    param_sets = [params] if single else list(params)
+    population = sum(city["population"] for city in density_list)
+    if pk is None:
+        pk = barabasi_albert_degrees(density_list)
+    degrees, weights = degree_classes(pk, num_bins)
+    mean_degree = np.dot(weights, degrees)
+    # Edges of an infected node that can still lead to a susceptible one
+    spreading_degrees = np.maximum(degrees - 1, 0) if pair_approximation else degrees
+
+    num_sets = len(param_sets)
+    fields = np.array(
+        [
+            (
+                p.initial_infection_rate,
+                p.recovery_rate,
+                p.mortality_rate,
+                max(p.incubation_period, 1),
+                p.mutation_rate,
+            )
+            for p in param_sets
+        ]
+    ).T
+    infection_rate, recovery_rate, mortality_rate, incubation, mutation_rate = fields
+    incubation = incubation.astype(np.int64)
+    # Infection rate of every set in every week, mutations included
+    mutations = np.zeros((num_sets, total_weeks))
+    for index, p in enumerate(param_sets):
+        weeks = [week for week in p.mutation_weeks if week < total_weeks]
+        mutations[index, weeks] = 1
+    weekly_rates = infection_rate[:, None] * mutation_rate[:, None] ** np.cumsum(
+        mutations, axis=1
+    )
+    died_rate = mortality_rate[:, None]
+    recovered_rate = ((1 - mortality_rate) * recovery_rate)[:, None]
+
+    # Shares of each degree class, (parameter set, degree class); exposures
+    # sit in a ring of the longest incubation period and each set reads the
+    # slot of its own incubation period
+    seed = num_initial_infections / population
+    susceptible = np.full((num_sets, len(degrees)), 1 - seed)
+    infected = np.zeros((num_sets, len(degrees)))
+    ring_days = int(incubation.max())
+    incubating = np.zeros((ring_days, num_sets, len(degrees)))
+    # Initial exposures count as exposed the day before the simulation starts
+    incubating[-1] = seed
+
+    new_cases = np.zeros((total_weeks, num_sets))
+    deaths = np.zeros((total_weeks, num_sets))
+    # Parameter sets still stepped; extinct ones are dropped from the arrays
+    live = np.arange(num_sets)
+    for week in range(total_weeks):
+        rate = weekly_rates[live, week]
+        rows = np.arange(len(live))
+        week_cases = np.zeros(len(live))
+        week_deaths = np.zeros(len(live))
+
+        for day_of_week in range(7):  # Simulate 7 days per week
+            day = 7 * week + day_of_week
+            theta = infected @ (weights * spreading_degrees) / mean_degree
+            # 1 - (1 - rate * theta)^k, via logs to avoid a power per class
+            escape = np.log1p(-rate * theta)
+            exposed = susceptible * -np.expm1(np.multiply.outer(escape, degrees))
+            matured = incubating[(day - incubation) % ring_days, rows]
+            died = infected * died_rate
+            recovered = infected * recovered_rate
+
+            # All transitions read the start-of-day shares, so apply them together
+            susceptible -= exposed
+            incubating[day % ring_days] = exposed
+            infected += matured - died - recovered
+            week_cases += matured @ weights
+            week_deaths += died @ weights
+
+        new_cases[week, live] = week_cases * population
+        deaths[week, live] = week_deaths * population
+
+        active = (infected + incubating.sum(axis=0)) @ weights * population
+        keep = active >= EXTINCT_PEOPLE
+        if not keep.all():
+            live = live[keep]
+            if len(live) == 0:
+                break
+            susceptible, infected = susceptible[keep], infected[keep]
+            incubating = incubating[:, keep]
+            incubation = incubation[keep]
+            died_rate, recovered_rate = died_rate[keep], recovered_rate[keep]
+
+    cumulative_cases = num_initial_infections + np.cumsum(new_cases, axis=0)
+    weekly_data = {"infection_status_dict_snapshots": None}
+    for series, values in (
+        ("new_cases", new_cases),
+        ("cumulative_cases", cumulative_cases),
+        ("deaths", deaths),
+    ):
+        weekly_data[series] = values[:, 0].tolist() if single else list(values)
+    return weekly_data
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mean-field SEIR over a grid of epidemic parameters"
+    )
+    parser.add_argument("--region", choices=list(REGIONS), default="vancouver")
+    parser.add_argument("--weeks", type=int, default=156, help="Simulated weeks")
+    parser.add_argument("--initial-infections", type=int, default=20)
+    parser.add_argument(
+        "--infection-rates",
+        type=float,
+        nargs="+",
+        default=[DEFAULT_PARAMETERS.initial_infection_rate],
+    )
+    parser.add_argument(
+        "--recovery-rates",
+        type=float,
+        nargs="+",
+        default=[DEFAULT_PARAMETERS.recovery_rate],
+    )
+    parser.add_argument(
+        "--mortality-rates",
+        type=float,
+        nargs="+",
+        default=[DEFAULT_PARAMETERS.mortality_rate],
+    )
+    parser.add_argument(
+        "--incubation-periods",
+        type=int,
+        nargs="+",
+        default=[DEFAULT_PARAMETERS.incubation_period],
+    )
+    parser.add_argument(
+        "--no-pair-approximation",
+        action="store_true",
+        help="Plain degree-based mean field, counting every edge of an infected node",
+    )
+    args = parser.parse_args()
+
+    density_list, _ = REGIONS[args.region]
+    grid = parameter_grid(
+        initial_infection_rate=args.infection_rates,
+        recovery_rate=args.recovery_rates,
+        mortality_rate=args.mortality_rates,
+        incubation_period=args.incubation_periods,
+    )
+    start = time.perf_counter()
+    weekly_data = solve_mean_field(
+        density_list,
+        args.initial_infections,
+        args.weeks,
+        grid,
+        pair_approximation=not args.no_pair_approximation,
+    )
+    seconds = time.perf_counter() - start
+    print(f"Solved {len(grid)} parameter sets in {seconds * 1000:.1f} ms")
+    print(
+        f"{'infection':>10}{'recovery':>10}{'mortality':>10}{'incubation':>11}"
+        f"{'peak week':>10}{'cases':>14}{'deaths':>12}"
+    )
+    new_cases = np.array(weekly_data["new_cases"])
+    total_deaths = np.sum(weekly_data["deaths"], axis=0)
+    for index, p in enumerate(grid):
+        print(
+            f"{p.initial_infection_rate:>10.3f}{p.recovery_rate:>10.3f}"
+            f"{p.mortality_rate:>10.3f}{p.incubation_period:>11}"
+            f"{new_cases[:, index].argmax() + 1:>10}"
+            f"{weekly_data['cumulative_cases'][-1][index]:>14.0f}"
+            f"{total_deaths[index]:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Callable, Optional
+import numpy as np
+from cache_paths import CACHE_DIR
+
+MODEL_CACHE_DIR = os.path.join(CACHE_DIR, "models")
+# Bump when the saved weights stop matching the models they are loaded into
+MODEL_CACHE_VERSION = 2
+WARM_EPOCHS = 5
+
+
+# Hash of a (series, days) training matrix, including its shape
+def series_fingerprint(cases: np.ndarray) -> str:
+    cases = np.ascontiguousarray(cases, dtype=np.float32)
+    digest = hashlib.sha256(repr(cases.shape).encode("utf-8"))
+    digest.update(cases.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def config_key(config: dict) -> str:
+    payload = json.dumps(
+        {"version": MODEL_CACHE_VERSION, "config": config}, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _read_index(path: str) -> list:
+    index_file = os.path.join(path, "index.json")
+    if not os.path.exists(index_file):
+        return []
+    with open(index_file, "r") as f:
+        return json.load(f)
+
+
+def _write_index(path: str, entries: list):
+    fd, tmp_file = tempfile.mkstemp(dir=path, suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(entries, f)
+    os.replace(tmp_file, os.path.join(path, "index.json"))
+
+
+# Longest cached training run whose series are a prefix of `cases`
+def _warm_start_entry(path: str, cases: np.ndarray) -> Optional[dict]:
+    best = None
+    for entry in _read_index(path):
+        days = entry["days"]
+        if days >= cases.shape[1] or (best is not None and days <= best["days"]):
+            continue
+        if not os.path.exists(os.path.join(path, entry["weights"])):
+            continue
+        if series_fingerprint(cases[:, :days]) == entry["series"]:
+            best = entry
+    return best
+
+
+# A model trained on `cases` (series x days) with `config`. Unchanged data loads
+# the cached weights; data that only gained new days warm-starts from the
+# longest cached prefix and trains `warm_epochs` on the days from
+# (cached days - overlap); anything else trains from scratch.
+# fit(model, start_day, epochs) trains on cases[:, start_day:]. Whatever else
+# the weights depend on (e.g. input scaling) goes through save_state() -> dict,
+# stored with the weights as JSON and handed to load_state(dict) before cached
+# weights are used or warm-started.
+def load_or_train_model(
+    build_model: Callable,
+    fit: Callable,
+    cases: np.ndarray,
+    config: dict,
+    epochs: int,
+    warm_epochs: int = WARM_EPOCHS,
+    overlap: int = 0,
+    rebuild: bool = False,
+    cache_dir: str = MODEL_CACHE_DIR,
+    save_state: Optional[Callable] = None,
+    load_state: Optional[Callable] = None,
+):
+    cases = np.atleast_2d(cases)
+    path = os.path.join(cache_dir, config_key(config))
+    series = series_fingerprint(cases)
+    weights_file = os.path.join(path, f"{series}.weights.h5")
+    model = build_model()
+    entries = [] if rebuild else _read_index(path)
+    cached = [item for item in entries if item["series"] == series]
+    if cached and os.path.exists(weights_file):
+        if load_state is not None:
+            load_state(cached[0].get("state", {}))
+        model.load_weights(weights_file)
+        return model, "cached"
+
+    entry = None if rebuild else _warm_start_entry(path, cases)
+    if entry is not None:
+        if load_state is not None:
+            load_state(entry.get("state", {}))
+        model.load_weights(os.path.join(path, entry["weights"]))
+        fit(model, max(entry["days"] - overlap, 0), warm_epochs)
+        status = "warm"
+    else:
+        fit(model, 0, epochs)
+        status = "trained"
+
+    os.makedirs(path, exist_ok=True)
+    # Keras picks the format from the suffix, so keep it on the temporary file
+    tmp_file = os.path.join(path, f"{series}.{os.getpid()}.tmp.weights.h5")
+    model.save_weights(tmp_file)
+    os.replace(tmp_file, weights_file)
+    entries = [item for item in _read_index(path) if item["series"] != series]
+    entries.append(
+        {
+            "series": series,
+            "days": int(cases.shape[1]),
+            "weights": os.path.basename(weights_file),
+            "state": {} if save_state is None else save_state(),
+        }
+    )
+    _write_index(path, entries)
+    return model, status
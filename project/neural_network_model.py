@@ -1,42 +1,12 @@
-import requests
-import csv
-from io import StringIO
+import argparse
 import numpy as np
+import pandas as pd
 import tensorflow as tf
 import matplotlib.pyplot as plt
 from IPython.display import clear_output
-
-# Fetch data from site
-url = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_global.csv"
-response = requests.get(url)
-csv_data = response.content.decode("utf-8")
-
-# Parse CSV data
-csv_reader = csv.reader(StringIO(csv_data))
-header = next(csv_reader)
-
-# Filter data for Canada
-canada_covid_data = [row for row in csv_reader if row[1] == "Canada"]
-
-# Combine header with data
-canada_covid_data_with_header = [dict(zip(header, row)) for row in canada_covid_data]
-
-# Convert data to a format suitable for training/testing
-dates = header[4:]  # Dates start from the 5th column
-
-# Separate data for each province
-province_data = {}
-for row in canada_covid_data_with_header:
-    province = row["Province/State"]
-    if province not in province_data:
-        province_data[province] = []
-    for date in dates:
-        province_data[province].append(float(row[date]))
-
-# Separate BC data and other provinces' data
-bc_data = np.array(province_data.pop("British Columbia")).reshape(-1, 1)
-other_provinces_data = list(province_data.values())
-other_provinces_names = list(province_data.keys())
+from forecasting import WINDOW, Forecaster
+from jhu_data import load_confirmed_cases
+from model_cache import WARM_EPOCHS, load_or_train_model
 
 
 # Define a custom accuracy function
@@ -60,23 +30,56 @@ def create_model():
     return model
 
 
-# Enable interactive mode
-plt.ion()
-fig, ax = plt.subplots(figsize=(10, 5))
+# All provinces at once: one head per province with the create_model layers,
+# stored as block-diagonal (per-head) kernels so every step trains every head
+def create_batch_model(num_heads: int):
+    model = tf.keras.models.Sequential()
+    model.add(tf.keras.layers.Input(shape=(num_heads, 1)))
+    for units in (64, 32, 16):
+        model.add(
+            tf.keras.layers.EinsumDense(
+                "bhi,hio->bho",
+                output_shape=(num_heads, units),
+                bias_axes="ho",
+                activation="relu",
+            )
+        )
+    model.add(
+        tf.keras.layers.EinsumDense(
+            "bhi,hio->bho", output_shape=(num_heads, 1), bias_axes="ho"
+        )
+    )
+    model.add(tf.keras.layers.Reshape((num_heads,)))
+    model.compile(
+        optimizer="adam", loss="mean_squared_error", metrics=[custom_accuracy]
+    )
+    return model
+
+
+# Per-head MSE and custom accuracy of (days, heads) predictions against BC
+def evaluate_heads(bc_data: np.ndarray, predictions: np.ndarray):
+    errors = predictions - bc_data
+    loss = np.mean(errors**2, axis=0)
+    accuracy = np.mean(np.abs(errors) < 0.05 * np.abs(bc_data), axis=0)
+    return loss, accuracy
 
 
 class PredictionCallback(tf.keras.callbacks.Callback):
-    def __init__(self, data_for_test, ax, province_name, province_data):
+    def __init__(self, data_for_test, ax, province_name, province_data, plot_every=1):
         super().__init__()
+        self.plot_every = plot_every
         self.data_for_test = data_for_test
         self.ax = ax
         self.province_name = province_name
         self.province_data = province_data
 
     def on_epoch_end(self, epoch, logs=None):
-        predictions = self.model.predict(self.data_for_test)
-        # Clear the output and plot the predictions after each epoch
+        if (epoch + 1) % self.plot_every:
+            return
+        predictions = self.model.predict(self.data_for_test, verbose=0)
+        # Clear the output and plot the predictions every plot_every epochs
         clear_output(wait=True)
+        ax = self.ax
         ax.clear()
         ax.plot(
             self.province_data,
@@ -99,33 +102,293 @@ class PredictionCallback(tf.keras.callbacks.Callback):
         plt.pause(0.01)
 
 
-# Train and evaluate the model for each province and predict BC's condition
-for i, (data_for_train, province_name) in enumerate(
-    zip(other_provinces_data, other_provinces_names)
-):
-    print(f"Training model with data from {province_name}...")
+# BC predictions of every head of the batch model, every plot_every epochs
+class BatchPredictionCallback(tf.keras.callbacks.Callback):
+    def __init__(self, data_for_test, ax, province_names, plot_every):
+        super().__init__()
+        self.data_for_test = data_for_test
+        self.ax = ax
+        self.province_names = province_names
+        self.plot_every = plot_every
 
-    # Convert lists to NumPy arrays and reshape to (number_of_samples, number_of_features)
-    data_for_train = np.array(data_for_train).reshape(-1, 1)
+    def on_epoch_end(self, epoch, logs=None):
+        if (epoch + 1) % self.plot_every:
+            return
+        inputs = np.repeat(self.data_for_test[:, None, :], len(self.province_names), 1)
+        predictions = self.model.predict(inputs, batch_size=256, verbose=0)
+        clear_output(wait=True)
+        ax = self.ax
+        ax.clear()
+        ax.plot(
+            self.data_for_test,
+            label="BC Actual Data",
+            color="green",
+            linestyle="dashed",
+            linewidth=2,
+        )
+        for head, province_name in enumerate(self.province_names):
+            ax.plot(predictions[:, head], label=f"Trained with {province_name}")
+        ax.set_title(f"BC Actual vs Predicted Data (epoch {epoch + 1})")
+        ax.set_xlabel("Days")
+        ax.set_ylabel("Confirmed Cases")
+        ax.legend(fontsize="small")
+        plt.draw()
+        plt.pause(0.01)
 
-    # Create and compile the model
-    model = create_model()
 
-    # Train the neural network
-    history = model.fit(
-        data_for_train,
-        data_for_train,
-        epochs=50,
-        batch_size=32,
-        verbose=0,
-        callbacks=[PredictionCallback(bc_data, ax, province_name, data_for_train)],
+# Build and train a model, through the model cache unless model_cache is None;
+# fit(model, start_day, epochs) trains on cases[:, start_day:]
+def train_model(build_model, fit, cases, config, epochs, model_cache):
+    if model_cache is None:
+        model = build_model()
+        fit(model, 0, epochs)
+        return model
+    model, status = load_or_train_model(
+        build_model, fit, cases, config, epochs, **model_cache
     )
+    print(f"  model {status}")
+    return model
+
+
+# Train one model per province after another, as before
+def train_sequential(
+    other_provinces_data,
+    other_provinces_names,
+    bc_data,
+    epochs,
+    ax,
+    plot_every,
+    model_cache=None,
+) -> pd.DataFrame:
+    summary = []
+    for data_for_train, province_name in zip(
+        other_provinces_data, other_provinces_names
+    ):
+        print(f"Training model with data from {province_name}...")
+
+        # Reshape to (number_of_samples, number_of_features)
+        data_for_train = data_for_train.reshape(-1, 1)
+
+        # Train the neural network
+        callbacks = []
+        if ax is not None:
+            callbacks.append(
+                PredictionCallback(
+                    bc_data, ax, province_name, data_for_train, plot_every
+                )
+            )
+
+        def fit(model, start_day, epochs):
+            model.fit(
+                data_for_train[start_day:],
+                data_for_train[start_day:],
+                epochs=epochs,
+                batch_size=32,
+                verbose=0,
+                callbacks=callbacks,
+            )
+
+        # Create (or load) and train the model
+        model = train_model(
+            create_model,
+            fit,
+            data_for_train.T,
+            {"model": "single", "epochs": epochs},
+            epochs,
+            model_cache,
+        )
+
+        # Evaluate how well the model performs
+        loss, accuracy = model.evaluate(bc_data, bc_data, verbose=0)
+        summary.append((province_name, loss, accuracy))
+    return pd.DataFrame(
+        summary, columns=["Province", "MSE on BC", "Custom Accuracy on BC"]
+    )
+
+
+# Train every province's model at once as the heads of one batch model
+def train_batch(
+    other_provinces_data,
+    other_provinces_names,
+    bc_data,
+    epochs,
+    ax,
+    plot_every,
+    model_cache=None,
+) -> pd.DataFrame:
+    print(f"Training {len(other_provinces_names)} province models at once...")
+    num_heads = len(other_provinces_names)
+    # (days, provinces, 1): each head sees its own province's value for a day
+    data_for_train = np.ascontiguousarray(other_provinces_data.T)
+    callbacks = []
+    if ax is not None:
+        callbacks.append(
+            BatchPredictionCallback(bc_data, ax, other_provinces_names, plot_every)
+        )
+
+    def fit(model, start_day, epochs):
+        model.fit(
+            data_for_train[start_day:, :, None],
+            data_for_train[start_day:],
+            epochs=epochs,
+            batch_size=32,
+            verbose=0,
+            callbacks=callbacks,
+        )
+
+    model = train_model(
+        lambda: create_batch_model(num_heads),
+        fit,
+        other_provinces_data,
+        {"model": "batch", "heads": num_heads, "epochs": epochs},
+        epochs,
+        model_cache,
+    )
+
+    # Evaluate every head on BC in a single pass
+    inputs = np.repeat(bc_data[:, None, :], num_heads, axis=1)
+    predictions = model.predict(inputs, batch_size=256, verbose=0)
+    loss, accuracy = evaluate_heads(bc_data, predictions)
+    return pd.DataFrame(
+        {
+            "Province": other_provinces_names,
+            "MSE on BC": loss,
+            "Custom Accuracy on BC": accuracy,
+        }
+    )
+
+
+# Train the sequence model without the last `horizon` days of every province,
+# then forecast those days for all provinces in one call
+def evaluate_forecast(
+    provinces, cases, horizon: int, window: int, epochs: int, model_cache=None
+) -> pd.DataFrame:
+    forecaster = Forecaster(provinces, cases[:, :-horizon], window)
+    if model_cache is None:
+        print(f"Training a forecasting model on {len(provinces)} provinces...")
+        forecaster.fit(epochs)
+    else:
+        status = forecaster.fit_cached(epochs, **model_cache)
+        print(f"Forecasting model on {len(provinces)} provinces: {status}")
+    predictions = forecaster.forecast(provinces, horizon).to_numpy()
+    actual = cases[:, -horizon:]
+    loss, accuracy = evaluate_heads(actual.T, predictions.T)
+    return pd.DataFrame(
+        {
+            "Province": provinces,
+            "Last Actual": actual[:, -1],
+            "Last Forecast": predictions[:, -1],
+            "MSE": loss,
+            "Custom Accuracy": accuracy,
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train a model per province and evaluate it on BC"
+    )
+    parser.add_argument(
+        "--refresh-data",
+        action="store_true",
+        help="Download the JHU time series again instead of using the cached copy",
+    )
+    parser.add_argument(
+        "--data-file",
+        default=None,
+        help="Use this local JHU confirmed cases CSV instead of the cached download",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["batch", "sequential", "forecast"],
+        default="batch",
+        help="Train all province models at once, one after another, or a "
+        "sequence model forecasting every province",
+    )
+    parser.add_argument("--epochs", type=int, default=50, help="Training epochs")
+    parser.add_argument(
+        "--plot-every",
+        type=int,
+        default=10,
+        help="Redraw the BC predictions every N epochs (0 disables live plotting)",
+    )
+    parser.add_argument(
+        "--horizon",
+        type=int,
+        default=14,
+        help="Days held out and forecast in forecast mode",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=WINDOW,
+        help="Days of history the forecasting model sees",
+    )
+    parser.add_argument(
+        "--no-model-cache",
+        action="store_true",
+        help="Always train from scratch and leave the model cache alone",
+    )
+    parser.add_argument(
+        "--rebuild-models",
+        action="store_true",
+        help="Retrain from scratch and overwrite the cached models",
+    )
+    parser.add_argument(
+        "--warm-epochs",
+        type=int,
+        default=WARM_EPOCHS,
+        help="Epochs on the new days when warm-starting from a cached model",
+    )
+    args = parser.parse_args()
+    model_cache = None
+    if not args.no_model_cache:
+        model_cache = {"warm_epochs": args.warm_epochs, "rebuild": args.rebuild_models}
+
+    # Provinces x dates matrix of confirmed cases, parsed once and cached
+    provinces, dates, cases = load_confirmed_cases(
+        "Canada", refresh=args.refresh_data, csv_path=args.data_file
+    )
+
+    if args.mode == "forecast":
+        summary = evaluate_forecast(
+            provinces, cases, args.horizon, args.window, args.epochs, model_cache
+        )
+        print(f"Forecast of the last {args.horizon} days:\n")
+        print(summary.to_string(index=False))
+        return
+
+    # Separate BC data and other provinces' data
+    bc_index = provinces.index("British Columbia")
+    bc_data = cases[bc_index].reshape(-1, 1)
+    other_provinces_data = np.delete(cases, bc_index, axis=0)
+    other_provinces_names = provinces[:bc_index] + provinces[bc_index + 1 :]
+
+    # Live plotting is throttled to every plot_every epochs, 0 turns it off
+    ax = None
+    if args.plot_every > 0:
+        plt.ion()
+        fig, ax = plt.subplots(figsize=(10, 5))
+
+    # Train and evaluate the model for each province and predict BC's condition
+    train = train_batch if args.mode == "batch" else train_sequential
+    summary = train(
+        other_provinces_data,
+        other_provinces_names,
+        bc_data,
+        args.epochs,
+        ax,
+        args.plot_every,
+        model_cache,
+    )
+    print("Evaluation on BC data:\n")
+    print(summary.to_string(index=False))
+
+    if ax is not None:
+        # Disable interactive mode
+        plt.ioff()
+        plt.show()
 
-    # Evaluate how well the model performs
-    loss, accuracy = model.evaluate(bc_data, bc_data, verbose=2)
-    print(f"Mean Squared Error on BC data: {loss}")
-    print(f"Custom Accuracy on BC data: {accuracy}")
 
-# Disable interactive mode
-plt.ioff()
-plt.show()
+if __name__ == "__main__":
+    main()
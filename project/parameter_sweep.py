@@ -0,0 +1,161 @@
+import argparse
+import itertools
+import json
+import os
+from multiprocessing import Pool
+from typing import Optional
+import numpy as np
+import pandas as pd
+from constants import REGIONS, DEFAULT_PARAMETERS, EpidemicParameters
+from csr_engine import get_initial_states, get_status_history_csr
+from graph_cache import (
+    graph_cache_path,
+    init_graph_worker,
+    load_or_build_community_csr,
+    worker_graph,
+)
+
+
+# Every combination of the given values, other fields taken from base
+def parameter_grid(
+    base: EpidemicParameters = DEFAULT_PARAMETERS, **values
+) -> list[EpidemicParameters]:
+    names = list(values)
+    return [
+        base._replace(**dict(zip(names, combination)))
+        for combination in itertools.product(*(values[name] for name in names))
+    ]
+
+
+def _run_scenario(task) -> pd.DataFrame:
+    scenario, replicate, params, seed_sequence, total_weeks, num_initial = task
+    rng = np.random.default_rng(seed_sequence)
+    initial_states, initial_infected = get_initial_states(
+        worker_graph(), num_initial, rng
+    )
+    weekly_data = get_status_history_csr(
+        None,
+        initial_states,
+        initial_infected,
+        total_weeks,
+        graph=worker_graph(),
+        rng=rng,
+        record_snapshots=False,
+        params=params,
+    )
+    # One row per week, parameters repeated as columns of the long table
+    rows = {"scenario": scenario, "replicate": replicate}
+    rows.update(params._asdict())
+    rows["mutation_weeks"] = " ".join(str(week) for week in params.mutation_weeks)
+    rows["week"] = np.arange(1, total_weeks + 1)
+    for series in ("new_cases", "cumulative_cases", "deaths"):
+        rows[series] = weekly_data[series]
+    return pd.DataFrame(rows)
+
+
+# Run every parameter set over one cached graph, appending results as they finish
+def run_sweep(
+    graph_path: str,
+    parameter_sets: list[EpidemicParameters],
+    total_weeks: int,
+    output_path: str,
+    replicates: int = 1,
+    num_initial_infections=20,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+):
+    if workers is None:
+        workers = os.cpu_count()
+    seed_sequences = iter(
+        np.random.SeedSequence(seed).spawn(len(parameter_sets) * replicates)
+    )
+    tasks = [
+        (
+            scenario,
+            replicate,
+            params,
+            next(seed_sequences),
+            total_weeks,
+            num_initial_infections,
+        )
+        for scenario, params in enumerate(parameter_sets)
+        for replicate in range(replicates)
+    ]
+
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    # Hand out small batches so thousands of short scenarios keep all cores busy
+    chunksize = max(1, len(tasks) // (workers * 8))
+    with Pool(workers, initializer=init_graph_worker, initargs=(graph_path,)) as pool:
+        results = pool.imap_unordered(_run_scenario, tasks, chunksize=chunksize)
+        for finished, table in enumerate(results):
+            table.to_csv(output_path, mode="a", header=finished == 0, index=False)
+            print(f"Finished {finished + 1}/{len(tasks)} runs", end="\r")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep COVID-19 simulation parameters over one cached graph"
+    )
+    parser.add_argument(
+        "--region",
+        type=str,
+        choices=list(REGIONS),
+        required=True,
+        help="Choose the region to simulate (bc, vancouver, vancouver_full, "
+        "bc_full for the real BC city populations, or canada for the provinces)",
+    )
+    parser.add_argument(
+        "--grid",
+        type=str,
+        default=None,
+        help="JSON object of parameter name -> list of values, e.g. "
+        '\'{"recovery_rate": [0.8, 0.9], "mortality_rate": [0.01, 0.02]}\'',
+    )
+    parser.add_argument(
+        "--parameter-file",
+        type=str,
+        default=None,
+        help="JSON file with a list of parameter sets (objects of overrides)",
+    )
+    parser.add_argument("--weeks", type=int, default=156)
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--graph-seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default="sweep_results.csv")
+    args = parser.parse_args()
+
+    if args.parameter_file is not None:
+        with open(args.parameter_file) as f:
+            parameter_sets = [
+                DEFAULT_PARAMETERS._replace(**overrides) for overrides in json.load(f)
+            ]
+    elif args.grid is not None:
+        parameter_sets = parameter_grid(**json.loads(args.grid))
+    else:
+        parser.error("one of --grid or --parameter-file is required")
+    parameter_sets = [
+        params._replace(mutation_weeks=tuple(params.mutation_weeks))
+        for params in parameter_sets
+    ]
+
+    population_density, inter_region_connection = REGIONS[args.region]
+    load_or_build_community_csr(
+        population_density, inter_region_connection, seed=args.graph_seed
+    )
+    run_sweep(
+        graph_cache_path(population_density, inter_region_connection, args.graph_seed),
+        parameter_sets,
+        args.weeks,
+        args.output,
+        replicates=args.replicates,
+        workers=args.workers,
+        seed=args.seed,
+    )
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import os
+from multiprocessing import Barrier, Process, Queue
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+import numpy as np
+from constants import DEFAULT_PARAMETERS, EpidemicParameters
+from csr_engine import (
+    SUSCEPTIBLE,
+    EXPOSED,
+    INFECTED,
+    RECOVERED,
+    DEAD,
+    gather_edges,
+)
+from graph_cache import load_graph
+from snapshot_store import SnapshotStore
+
+
+# Number of edges from every worker's nodes into every other worker's nodes,
+# which bounds the exposures one worker can post to another in a day
+def cross_partition_edges(graph, node_bounds: np.ndarray) -> np.ndarray:
+    workers = len(node_bounds) - 1
+    counts = np.zeros((workers, workers), dtype=np.int64)
+    for sender in range(workers):
+        start, end = node_bounds[sender], node_bounds[sender + 1]
+        targets = graph.indices[graph.indptr[start] : graph.indptr[end]]
+        receivers = np.searchsorted(node_bounds, targets, side="right") - 1
+        counts[sender] = np.bincount(receivers, minlength=workers)
+    np.fill_diagonal(counts, 0)
+    return counts
+
+
+# Split the communities into contiguous blocks with roughly equal node counts
+def partition_communities(community_offsets: np.ndarray, workers: int) -> list:
+    num_communities = len(community_offsets) - 1
+    workers = max(1, min(workers, num_communities))
+    targets = community_offsets[-1] * np.arange(1, workers) / workers
+    cuts = np.searchsorted(community_offsets[1:], targets)
+    bounds = np.unique(np.concatenate([[0], cuts + 1, [num_communities]]))
+    bounds = bounds[bounds <= num_communities]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+class _CommunityFrontier:
+    # Frontier of one community, stepped with that community's own RNG stream
+    # so results do not depend on which worker owns the community
+    def __init__(self, states, start, end, incubation_days, seed_sequence):
+        self.start, self.end = start, end
+        self.rng = np.random.default_rng(seed_sequence)
+        self.infected = start + np.flatnonzero(states[start:end] == INFECTED)
+        self.incubating = [np.empty(0, dtype=np.int64) for _ in range(incubation_days)]
+        self.incubating[-1] = start + np.flatnonzero(states[start:end] == EXPOSED)
+        self.died = self.recovered = None
+
+
+# Views of the shared memory: the state array, the mailboxes of boundary
+# exposures, how many each worker posted to each other one, and the number of
+# exposed and infected nodes of every worker at the end of the day
+def _shared_arrays(memories, num_nodes: int, workers: int, mailbox_size: int):
+    states_memory, mailbox_memory, posted_memory, active_memory = memories
+    return (
+        np.ndarray(num_nodes, dtype=np.uint8, buffer=states_memory.buf),
+        np.ndarray(mailbox_size, dtype=np.int64, buffer=mailbox_memory.buf),
+        np.ndarray((workers, workers), dtype=np.int64, buffer=posted_memory.buf),
+        np.ndarray(workers, dtype=np.int64, buffer=active_memory.buf),
+    )
+
+
+def _partition_worker(
+    graph_path,
+    shared_names,
+    worker,
+    node_bounds,
+    mailbox_offsets,
+    community_range,
+    seed_sequences,
+    params,
+    total_weeks,
+    barrier,
+    results,
+):
+    graph = load_graph(graph_path)
+    workers = len(node_bounds) - 1
+    memories = [SharedMemory(name=name) for name in shared_names]
+    try:
+        states, mailboxes, posted, active = _shared_arrays(
+            memories, graph.num_nodes, workers, mailbox_offsets[-1]
+        )
+        incubation_days = max(params.incubation_period, 1)
+        first, last = community_range
+        own_start, own_end = node_bounds[worker], node_bounds[worker + 1]
+        frontiers = [
+            _CommunityFrontier(
+                states,
+                graph.community_offsets[c],
+                graph.community_offsets[c + 1],
+                incubation_days,
+                seed_sequences[c - first],
+            )
+            for c in range(first, last)
+        ]
+        weekly = np.zeros((total_weeks, 2), dtype=np.int64)
+        infection_rate = params.initial_infection_rate
+
+        for day in range(7 * total_weeks):
+            week = day // 7
+            if day % 7 == 0 and week in params.mutation_weeks:
+                infection_rate *= params.mutation_rate
+            slot = day % incubation_days
+
+            # Phase 1: read the start-of-day states, keep the successful
+            # transmissions to owned nodes and post the others to the
+            # mailbox of the worker that owns the target
+            exposures = []
+            for frontier in frontiers:
+                _, targets = gather_edges(graph, frontier.infected)
+                targets = targets[states[targets] == SUSCEPTIBLE]
+                success = frontier.rng.random(len(targets)) < infection_rate
+                exposures.append(targets[success])
+                count = len(frontier.infected)
+                frontier.died = frontier.rng.random(count) < params.mortality_rate
+                frontier.recovered = ~frontier.died & (
+                    frontier.rng.random(count) < params.recovery_rate
+                )
+            exposures = np.unique(np.concatenate(exposures))
+            own = (exposures >= own_start) & (exposures < own_end)
+            outgoing = exposures[~own]
+            receivers = np.searchsorted(node_bounds, outgoing, side="right") - 1
+            for receiver in range(workers):
+                sent = outgoing[receivers == receiver]
+                offset = mailbox_offsets[worker * workers + receiver]
+                mailboxes[offset : offset + len(sent)] = sent
+                posted[worker, receiver] = len(sent)
+            barrier.wait()
+
+            # Phase 2: apply the day's transitions to the owned nodes only
+            received = [exposures[own]]
+            for sender in range(workers):
+                offset = mailbox_offsets[sender * workers + worker]
+                received.append(mailboxes[offset : offset + posted[sender, worker]])
+            exposures = np.unique(np.concatenate(received))
+            for frontier in frontiers:
+                newly_exposed = exposures[
+                    np.searchsorted(exposures, frontier.start) : np.searchsorted(
+                        exposures, frontier.end
+                    )
+                ]
+                matured = frontier.incubating[slot]
+                infected = frontier.infected
+                states[newly_exposed] = EXPOSED
+                states[matured] = INFECTED
+                states[infected[frontier.died]] = DEAD
+                states[infected[frontier.recovered]] = RECOVERED
+                frontier.incubating[slot] = newly_exposed
+                frontier.infected = np.concatenate(
+                    [infected[~frontier.died & ~frontier.recovered], matured]
+                )
+                weekly[week, 0] += len(matured)
+                weekly[week, 1] += int(frontier.died.sum())
+            active[worker] = sum(
+                len(frontier.infected) + sum(map(len, frontier.incubating))
+                for frontier in frontiers
+            )
+            barrier.wait()
+            # Every process sees the same counts here, so all leave together
+            if not active.any():
+                break
+        del states, mailboxes, posted, active
+        results.put(weekly)
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        for memory in memories:
+            memory.close()
+
+
+# Step community blocks in parallel worker processes that share one state array
+def get_status_history_partitioned(
+    graph_path: str,
+    initial_states: np.ndarray,
+    initial_infected: list,
+    total_weeks: int,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    params: EpidemicParameters = DEFAULT_PARAMETERS,
+    record_snapshots: bool = True,
+):
+    graph = load_graph(graph_path)
+    if workers is None:
+        workers = os.cpu_count()
+    partitions = partition_communities(graph.community_offsets, workers)
+    workers = len(partitions)
+    node_bounds = graph.community_offsets[[first for first, _ in partitions] + [-1]]
+    # Only exposures across partitions go through shared memory, each worker
+    # pair with a mailbox large enough for every edge between them
+    mailbox_offsets = np.zeros(workers * workers + 1, dtype=np.int64)
+    np.cumsum(cross_partition_edges(graph, node_bounds), out=mailbox_offsets[1:])
+    # One stream per community, so any worker count draws the same numbers
+    seed_sequences = np.random.SeedSequence(seed).spawn(
+        len(graph.community_offsets) - 1
+    )
+
+    memories = [
+        SharedMemory(create=True, size=max(size, 1))
+        for size in (
+            graph.num_nodes,
+            8 * mailbox_offsets[-1],
+            8 * workers * workers,
+            8 * workers,
+        )
+    ]
+    try:
+        states, mailboxes, posted, active = _shared_arrays(
+            memories, graph.num_nodes, workers, mailbox_offsets[-1]
+        )
+        states[:] = initial_states
+        snapshots = SnapshotStore(states) if record_snapshots else None
+
+        # The main process joins every barrier so it can snapshot between weeks
+        barrier = Barrier(workers + 1)
+        results = Queue()
+        processes = [
+            Process(
+                target=_partition_worker,
+                args=(
+                    graph_path,
+                    [memory.name for memory in memories],
+                    worker,
+                    node_bounds,
+                    mailbox_offsets,
+                    (first, last),
+                    seed_sequences[first:last],
+                    params,
+                    total_weeks,
+                    barrier,
+                    results,
+                ),
+            )
+            for worker, (first, last) in enumerate(partitions)
+        ]
+        for process in processes:
+            process.start()
+        for day in range(7 * total_weeks):
+            barrier.wait()
+            barrier.wait()
+            if snapshots is not None and day % 7 == 6:
+                snapshots.record(states)
+            # No exposed or infected nodes left, so nothing changes any more
+            if not active.any():
+                break
+        if snapshots is not None:
+            while len(snapshots) < total_weeks:
+                snapshots.record(states)
+        weekly = sum(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+        del states, mailboxes, posted, active
+    finally:
+        for memory in memories:
+            memory.close()
+            memory.unlink()
+
+    new_cases = weekly[:, 0].tolist()
+    return {
+        "new_cases": new_cases,
+        "cumulative_cases": (len(initial_infected) + np.cumsum(new_cases)).tolist(),
+        "deaths": weekly[:, 1].tolist(),
+        "infection_status_dict_snapshots": snapshots,
+    }
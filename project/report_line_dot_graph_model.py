@@ -1,50 +1,69 @@
 import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
 from typing import Tuple
 import networkx as nx
+import numpy as np
 import random
 import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgba_array
 from matplotlib.widgets import Slider
 import pandas as pd
 from constants import (
-    BC_POPULATION_DENSITY,
     VAN_POPULATION_DENSITY_REDUCED,
-    VAN_POPULATION_DENSITY_FULL,
     INTER_REGION_CONNECTIONS,
-    INITIAL_INFECTION_RATE,
-    MORTALITY_RATE,
-    RECOVERY_RATE,
-    INCUBATION_PERIOD,
-    MUTATION_WEEKS,
-    MUTATION_RATE,
+    REGIONS,
+    FULL_POPULATION_REGIONS,
+    HYBRID_REGIONS,
+    MEMORY_BUDGET_GB,
+    DEFAULT_PARAMETERS,
+    EpidemicParameters,
+    COMPARTMENT_COLORS,
 )
+from csr_engine import (
+    EXPOSED,
+    INFECTED,
+    RECOVERED,
+    get_initial_states,
+    get_status_history_csr,
+    states_from_dict,
+    iter_status_history,
+    extinct,
+    case_threshold,
+)
+from graph_builder import build_community_csr, csr_to_networkx
+from graph_cache import (
+    graph_cache_path,
+    load_or_build_community_csr,
+    load_or_compute_layout,
+)
+from animation_export import export_animation
+from snapshot_store import SnapshotStore
+from community_view import (
+    compartment_legend,
+    visualize_community_graph,
+    weekly_community_counts,
+)
+from event_engine import get_status_history_event
+from partitioned_engine import get_status_history_partitioned
+from hybrid_engine import PROMOTE_AT_CASES, MAX_AGENT_NODES, get_status_history_hybrid
+from mean_field import solve_mean_field
+from ensemble import WEEKLY_SERIES, run_ensemble
+from instrumentation import PROFILE_HOOKS, instrumentation
 
 
 def create_community_graph(
     density_list=VAN_POPULATION_DENSITY_REDUCED,
     inter_region_connections=INTER_REGION_CONNECTIONS["Vancouver"],
+    seed=None,
 ) -> nx.Graph:
-    # Create a community graph using barabasi_albert_graph theory
-    community_graphs = [
-        nx.barabasi_albert_graph(each_city["population"], each_city["density"])
-        for each_city in density_list
-    ]
-    # Combine regions into a single graph with inter-regional connections
-    G = nx.Graph()
-    offset = 0
-    for idx, community in enumerate(community_graphs):
-        # Renumber nodes to prevent conflicts
-        mapping = {node: node + offset for node in community.nodes}
-        community = nx.relabel_nodes(community, mapping)
-        G = nx.compose(G, community)
-        offset += community.number_of_nodes()
-
-        # Inter-region connections
-        if idx < len(community_graphs) - 1:
-            for _ in range(inter_region_connections):
-                node_a = random.choice(list(community.nodes))
-                node_b = random.choice(list(community_graphs[idx + 1].nodes)) + offset
-                G.add_edge(node_a, node_b)
-    return G
+    # Create a community graph using barabasi_albert_graph theory, generated
+    # straight into one edge list and converted to networkx once at the end
+    graph = build_community_csr(density_list, inter_region_connections, seed)
+    return csr_to_networkx(graph)
 
 
 # Initialize Infection Status
@@ -59,12 +78,32 @@ def get_initial_infection_status(
     return initial_infection_status_dict, initial_infected_nodes
 
 
+# Per-day counters of the dict engine, recounted from the day's start and end
+# states so the simulation loop itself stays free of bookkeeping
+def record_dict_day(G: nx.Graph, before: dict, after: dict):
+    infected = [node for node, status in before.items() if status == "I"]
+    edges_examined = sum(len(G[node]) for node in infected)
+    # One draw per susceptible neighbor, one for death and one for recovery
+    # unless the node died
+    neighbor_draws = sum(
+        before[neighbor] == "S" for node in infected for neighbor in G[node]
+    )
+    died = sum(after[node] == "D" for node in infected)
+    instrumentation.record_day(
+        nodes_scanned=len(G),
+        edges_examined=edges_examined,
+        rng_draws=neighbor_draws + 2 * len(infected) - died,
+        transitions=sum(before[node] != after[node] for node in G.nodes),
+    )
+
+
 # Weekly Reporting
 def simulate_week(
     G: nx.Graph,
     infection_status_dict: dict[str, str],
     exposed_duration: dict[str, int],
     infection_rate,
+    params: EpidemicParameters = DEFAULT_PARAMETERS,
 ) -> dict[str, list[int]]:
     new_cases = 0
     deaths = 0
@@ -75,7 +114,7 @@ def simulate_week(
         for node in G.nodes:
             if infection_status_dict[node] == "E":
                 exposed_duration[node] += 1
-                if exposed_duration[node] >= INCUBATION_PERIOD:
+                if exposed_duration[node] >= params.incubation_period:
                     new_infection_status_dict[node] = "I"
                     new_cases += 1
 
@@ -89,11 +128,13 @@ def simulate_week(
                         new_infection_status_dict[neighbor] = "E"
 
                 # Death or Recovery
-                if random.random() < MORTALITY_RATE:
+                if random.random() < params.mortality_rate:
                     new_infection_status_dict[node] = "D"
                     deaths += 1
-                elif random.random() < RECOVERY_RATE:
+                elif random.random() < params.recovery_rate:
                     new_infection_status_dict[node] = "R"
+        if instrumentation.enabled:
+            record_dict_day(G, infection_status_dict, new_infection_status_dict)
         infection_status_dict.update(new_infection_status_dict)
 
     return new_cases, deaths
@@ -104,34 +145,49 @@ def get_status_history(
     initial_infection_status_dict: dict,
     initial_infected: list,
     total_weeks: int,
+    params: EpidemicParameters = DEFAULT_PARAMETERS,
 ):
     cumulative_cases = len(initial_infected)
+    # Weekly snapshots go into the same delta store as the array engines
+    snapshots = SnapshotStore(states_from_dict(len(G), initial_infection_status_dict))
     weekly_data = {
         "new_cases": [],
         "cumulative_cases": [],
         "deaths": [],
-        "infection_status_dict_snapshots": [],
+        "infection_status_dict_snapshots": snapshots,
     }
     infection_status_dict = initial_infection_status_dict.copy()
     exposed_duration_dict = {node: 0 for node in G.nodes}
-    infection_rate = INITIAL_INFECTION_RATE
+    infection_rate = params.initial_infection_rate
+    extinct = False
 
     for week in range(total_weeks):
         # Mutation Effect
-        if week in MUTATION_WEEKS:
-            infection_rate *= MUTATION_RATE
-
-        new_cases, deaths = simulate_week(
-            G, infection_status_dict, exposed_duration_dict, infection_rate
-        )
+        if week in params.mutation_weeks:
+            infection_rate *= params.mutation_rate
+
+        # No exposed or infected nodes left, so nothing changes any more
+        if extinct:
+            new_cases, deaths = 0, 0
+        else:
+            with instrumentation.phase("step", week=week + 1):
+                new_cases, deaths = simulate_week(
+                    G,
+                    infection_status_dict,
+                    exposed_duration_dict,
+                    infection_rate,
+                    params,
+                )
+            extinct = not any(
+                status in ("E", "I") for status in infection_status_dict.values()
+            )
         cumulative_cases += new_cases
 
         weekly_data["new_cases"].append(new_cases)
         weekly_data["cumulative_cases"].append(cumulative_cases)
         weekly_data["deaths"].append(deaths)
-        weekly_data["infection_status_dict_snapshots"].append(
-            infection_status_dict.copy()
-        )
+        with instrumentation.phase("snapshot", week=week + 1):
+            snapshots.record(states_from_dict(len(G), infection_status_dict))
     return weekly_data
 
 
@@ -146,10 +202,39 @@ def print_weekly_report(weekly_data: dict, total_weeks: int):
         )
 
 
+# Print Per-Community Report
+def print_community_report(weekly_data: dict, community_names: list, week: int):
+    counts = weekly_data["community_counts"][week - 1]
+    community_df = pd.DataFrame(
+        {
+            "Community": community_names,
+            "Cumulative Cases": weekly_data["community_cumulative_cases"][week - 1],
+            "Exposed": counts[:, EXPOSED],
+            "Infected": counts[:, INFECTED],
+            "Recovered": counts[:, RECOVERED],
+            "Deaths": weekly_data["community_deaths"][week - 1],
+        }
+    )
+    print(f"Community Report for Week {week}:")
+    print(community_df.to_string(index=False))
+
+
+# Stream weekly records as CSV rows as soon as they are simulated
+def stream_weekly_report(records, output=sys.stdout):
+    writer = None
+    for record in records:
+        if writer is None:
+            writer = csv.DictWriter(output, fieldnames=list(record))
+            writer.writeheader()
+        writer.writerow(record)
+        output.flush()
+
+
 # Visualization
 def visualize_simulation_line_graph(
-    weekly_data: dict,  # {'new_cases': list[int], 'cumulative_cases': list[int], 'deaths': list[int], 'infection_status_dict_snapshots': list[dict]}
+    weekly_data: dict,  # {'new_cases': list[int], 'cumulative_cases': list[int], 'deaths': list[int], 'infection_status_dict_snapshots': SnapshotStore}
     total_weeks: int,
+    bands: dict = None,  # {'new_cases': (lower, upper), ...} from an ensemble run
 ):
     weeks_range = range(1, total_weeks + 1)
     # Plot case variance line graph
@@ -161,101 +246,65 @@ def visualize_simulation_line_graph(
             "Deaths": weekly_data["deaths"],
         }
     )
-    weekly_df.plot(
+    ax = weekly_df.plot(
         title="COVID-19 Weekly Report for Vancouver Simulation",
         x="Week",
         y=["New Cases", "Cumulative Cases", "Deaths"],
         legend=True,
         grid=True,
     )
+    # Shade the ensemble percentile band around each line
+    if bands is not None:
+        for line, series in zip(
+            ax.get_lines(), ["new_cases", "cumulative_cases", "deaths"]
+        ):
+            lower, upper = bands[series]
+            ax.fill_between(
+                weeks_range, lower, upper, color=line.get_color(), alpha=0.2
+            )
     plt.show()
 
 
 def visualize_simulation_dotted_graph(
-    G: nx.Graph, infection_status_dict_snapshots: list[dict], total_weeks: int
+    G: nx.Graph,
+    infection_status_dict_snapshots: SnapshotStore,
+    total_weeks: int,
+    positions: np.ndarray = None,  # (N, 2) fixed layout, see graph_cache
 ):
+    if positions is None:
+        layout = nx.spring_layout(G, seed=0)
+        positions = np.array([layout[node] for node in range(len(layout))])
+    palette = to_rgba_array(COMPARTMENT_COLORS)
+
     # Plow an interactive graph in a new figure
     fig, ax = plt.subplots()
     plt.subplots_adjust(left=0.1, bottom=0.25)
+    ax.set_axis_off()
+
+    # Draw every node once, slider moves only recolor the collection
+    nodes = ax.scatter(positions[:, 0], positions[:, 1], s=10, linewidths=0)
+
+    # Adding a legend
+    compartment_legend(ax)
 
     # Create the slider
     ax_slider = plt.axes([0.1, 0.1, 0.8, 0.05], facecolor="lightgoldenrodyellow")
-    slider = Slider(ax_slider, "Week", 0, total_weeks, valinit=0, valstep=1)
+    slider = Slider(ax_slider, "Week", 0, total_weeks - 1, valinit=0, valstep=1)
 
     def slider_update(val):
         week = int(val)
-        current_infection_status_dict = infection_status_dict_snapshots[week]
-        color_map = {"S": "blue", "E": "orange", "I": "red", "R": "green", "D": "black"}
-        node_colors = [
-            color_map[current_infection_status_dict[node]] for node in G.nodes
-        ]
-
-        ax.clear()
-        nx.draw(
-            G,
-            node_color=node_colors,
-            with_labels=False,
-            node_size=10,
-            ax=ax,
-            edge_color="none",
-        )
+        states = infection_status_dict_snapshots.states(week)
+        nodes.set_facecolor(palette[states])
         ax.set_title(f"Week {week}")
-
-        # Adding a legend
-        legend_elements = [
-            plt.Line2D(
-                [0],
-                [0],
-                marker="o",
-                color="w",
-                markerfacecolor="blue",
-                markersize=10,
-                label="Susceptible",
-            ),
-            plt.Line2D(
-                [0],
-                [0],
-                marker="o",
-                color="w",
-                markerfacecolor="orange",
-                markersize=10,
-                label="Exposed",
-            ),
-            plt.Line2D(
-                [0],
-                [0],
-                marker="o",
-                color="w",
-                markerfacecolor="red",
-                markersize=10,
-                label="Infected",
-            ),
-            plt.Line2D(
-                [0],
-                [0],
-                marker="o",
-                color="w",
-                markerfacecolor="green",
-                markersize=10,
-                label="Recovered",
-            ),
-            plt.Line2D(
-                [0],
-                [0],
-                marker="o",
-                color="w",
-                markerfacecolor="black",
-                markersize=10,
-                label="Dead",
-            ),
-        ]
-        ax.legend(handles=legend_elements, loc="upper right")
+        fig.canvas.draw_idle()
 
     # Update the graph when the slider value changes
     slider.on_changed(slider_update)
 
     # Initialize interactive graph
     slider_update(0)
+    # Keep the slider alive as long as the figure
+    fig.slider = slider
 
     # Show all plots
     plt.show()
@@ -268,39 +317,439 @@ def main():
     parser.add_argument(
         "--region",
         type=str,
-        choices=["bc", "vancouver", "vancouver_full"],
+        choices=list(REGIONS),
         required=True,
-        help="Choose the region to simulate (bc, vancouver, or vancouver_full)",
+        help="Choose the region to simulate (bc, vancouver, vancouver_full, "
+        "bc_full for the real BC city populations, or canada for the provinces)",
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["dict", "array", "partitioned", "event", "hybrid", "mean-field"],
+        default=None,
+        help="Simulation engine: per-node dicts (dict), vectorized CSR arrays "
+        "(array) or CSR arrays stepped per community block in --workers "
+        "processes (partitioned), or day lists of scheduled state changes "
+        "(event, faster than array only when nodes stay infected for long, "
+        "e.g. a low recovery rate), or SEIR compartments with node-level hot spots (hybrid), or "
+        "the deterministic degree-based mean field (mean-field). "
+        "Default: array, hybrid for canada",
+    )
+    parser.add_argument(
+        "--graph-seed",
+        type=int,
+        default=0,
+        help="Seed of the generated community graph, part of the graph cache key",
+    )
+    parser.add_argument(
+        "--rebuild-graph",
+        action="store_true",
+        help="Regenerate the community graph instead of loading it from the cache",
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        type=str,
+        default=None,
+        help="Directory to spill the weekly snapshots to as memory-mapped files",
+    )
+    parser.add_argument(
+        "--replicates",
+        type=int,
+        default=1,
+        help="Number of independent runs on the array engine; more than one "
+        "plots mean and percentile bands",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for --replicates, the partitioned engine or "
+        "--export-animation (default: all cores)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed of the initial infections and daily draws of every "
+        "stochastic engine, the ensemble replicates and --stream",
+    )
+    parser.add_argument(
+        "--export-animation",
+        type=str,
+        default=None,
+        help="Render every week's node-level snapshot in parallel and encode "
+        "them to this .gif or .mp4 file instead of opening the slider",
+    )
+    parser.add_argument(
+        "--frames-dir",
+        type=str,
+        default=None,
+        help="Directory for the exported PNG frames "
+        "(default: next to the --export-animation file)",
+    )
+    parser.add_argument(
+        "--community-view",
+        action="store_true",
+        help="Show one super-node per community instead of every node "
+        "(always used for bc)",
+    )
+    parser.add_argument(
+        "--community-report",
+        action="store_true",
+        help="Also print per-community case counts for the last week "
+        "(array engine only)",
+    )
+    parser.add_argument(
+        "--stream",
+        type=str,
+        default=None,
+        help="Stream weekly CSV rows to this file ('-' for stdout) as they are "
+        "simulated on the array engine, without keeping snapshots or plotting",
+    )
+    parser.add_argument(
+        "--stop-when-extinct",
+        action="store_true",
+        help="With --stream, stop once no exposed or infected nodes are left",
+    )
+    parser.add_argument(
+        "--stop-at-cases",
+        type=int,
+        default=None,
+        help="With --stream, stop once cumulative cases reach this number",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="Record phase timers and per-day counters and write them to this "
+        ".json or .csv trace",
+    )
+    parser.add_argument(
+        "--profile-hook",
+        choices=PROFILE_HOOKS,
+        default=None,
+        help="With --profile, also run the weekly loop under cProfile or "
+        "pyinstrument (saved next to the trace)",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=MEMORY_BUDGET_GB,
+        help="Memory budget in GB for generating the graph; larger graphs are "
+        "built in memory-mapped files",
+    )
+    parser.add_argument(
+        "--promote-at",
+        type=int,
+        default=PROMOTE_AT_CASES,
+        help="With the hybrid engine, simulate a community node by node once its "
+        "cumulative cases reach this number",
+    )
+    parser.add_argument(
+        "--agent-communities",
+        nargs="+",
+        default=[],
+        help="With the hybrid engine, communities simulated node by node from "
+        "the start",
+    )
+    parser.add_argument(
+        "--max-agent-nodes",
+        type=int,
+        default=MAX_AGENT_NODES,
+        help="With the hybrid engine, stop promoting communities once the "
+        "node-level ones would exceed this many nodes",
     )
     args = parser.parse_args()
-    draw_dot_graph = True
-
-    if args.region == "bc":
-        population_density = BC_POPULATION_DENSITY
-        inter_region_connection = INTER_REGION_CONNECTIONS["BC"]
-        draw_dot_graph = False
-    elif args.region == "vancouver":
-        population_density = VAN_POPULATION_DENSITY_REDUCED
-        inter_region_connection = INTER_REGION_CONNECTIONS["Vancouver"]
-    elif args.region == "vancouver_full":
-        population_density = VAN_POPULATION_DENSITY_FULL
-        inter_region_connection = INTER_REGION_CONNECTIONS["Vancouver"]
+    if args.engine is None:
+        # Replicates and streaming always run on the array engine
+        if (
+            args.region in HYBRID_REGIONS
+            and args.replicates == 1
+            and args.stream is None
+        ):
+            args.engine = "hybrid"
+        else:
+            args.engine = "array"
+    if args.engine == "dict" and args.region in FULL_POPULATION_REGIONS:
+        parser.error(f"{args.region} is too large for the dict engine")
+    if args.replicates > 1 and args.engine != "array":
+        parser.error(f"--replicates runs the array engine, not {args.engine}")
+    if args.stream is not None and args.engine != "array":
+        parser.error(f"--stream runs the array engine, not {args.engine}")
+    if args.stream is None and (
+        args.stop_when_extinct or args.stop_at_cases is not None
+    ):
+        parser.error("--stop-when-extinct and --stop-at-cases need --stream")
+    if args.engine in ("hybrid", "mean-field"):
+        # These engines keep community or population counts, not node-level
+        # snapshots
+        for option, value in (
+            ("--export-animation", args.export_animation),
+            ("--snapshot-dir", args.snapshot_dir),
+            ("--community-view", args.community_view),
+        ):
+            if value:
+                parser.error(f"{option} needs node-level snapshots, not {args.engine}")
+    community_names = [city["name"] for city in REGIONS[args.region][0]]
+    for name in args.agent_communities:
+        if name not in community_names:
+            parser.error(f"{name} is not a community of {args.region}")
+    if args.profile is not None:
+        instrumentation.enable(args.profile_hook)
+    try:
+        simulate_and_report(args)
+    finally:
+        if args.profile is not None:
+            instrumentation.write_trace(args.profile)
+            instrumentation.print_summary()
+
+
+def simulate_and_report(args):
+    population_density, inter_region_connection = REGIONS[args.region]
+    # BC is too large to draw node by node, so it always gets the community view
+    draw_community_view = (
+        args.community_view
+        or args.region == "bc"
+        or args.region in FULL_POPULATION_REGIONS
+    )
 
     # Simulate 52 * 3 = 156 weeks (3 years)
     total_weeks = 156
     num_initial_infections = 20
-    G = create_community_graph(population_density, inter_region_connection)
-    initial_infection_status_dict, initial_infected = get_initial_infection_status(
-        G, num_initial_infections
-    )
-    weekly_data = get_status_history(
-        G, initial_infection_status_dict, initial_infected, total_weeks
-    )
-    print_weekly_report(weekly_data, total_weeks)
+    if args.engine == "hybrid":
+        simulate_and_report_hybrid(args, total_weeks, num_initial_infections)
+        return
+    if args.engine == "mean-field":
+        simulate_and_report_mean_field(args, total_weeks, num_initial_infections)
+        return
+
+    with instrumentation.phase("build"):
+        graph = load_or_build_community_csr(
+            population_density,
+            inter_region_connection,
+            seed=args.graph_seed,
+            rebuild=args.rebuild_graph,
+            memory_budget=int(args.memory_budget * (1 << 30)),
+        )
+
+    if args.stream is not None:
+        predicates = []
+        if args.stop_when_extinct:
+            predicates.append(extinct)
+        if args.stop_at_cases is not None:
+            predicates.append(case_threshold(args.stop_at_cases))
+        rng = np.random.default_rng(args.seed)
+        with instrumentation.phase("seed"):
+            initial_states, initial_infected = get_initial_states(
+                graph, num_initial_infections, rng
+            )
+        records = iter_status_history(
+            graph,
+            initial_states,
+            initial_infected,
+            total_weeks,
+            rng=rng,
+            stop_when=lambda record: any(stop(record) for stop in predicates),
+        )
+        with instrumentation.profiled(args.profile):
+            if args.stream == "-":
+                stream_weekly_report(records)
+            else:
+                with open(args.stream, "w", newline="") as output:
+                    stream_weekly_report(records, output)
+        return
+
+    if args.replicates > 1:
+        with instrumentation.phase("simulate"):
+            ensemble = run_ensemble(
+                graph_cache_path(
+                    population_density, inter_region_connection, args.graph_seed
+                ),
+                args.replicates,
+                total_weeks,
+                num_initial_infections,
+                workers=args.workers,
+                seed=args.seed,
+            )
+        weekly_data = {series: ensemble[series]["mean"] for series in WEEKLY_SERIES}
+        bands = {
+            series: (ensemble[series]["lower"], ensemble[series]["upper"])
+            for series in WEEKLY_SERIES
+        }
+        print(f"Mean of {args.replicates} replicates")
+        with instrumentation.phase("report"):
+            print_weekly_report(weekly_data, total_weeks)
+        with instrumentation.phase("render"):
+            visualize_simulation_line_graph(weekly_data, total_weeks, bands)
+        return
+
+    # The networkx graph is only needed by the dict engine
+    G = None
+    if args.engine == "dict":
+        with instrumentation.phase("build"):
+            G = csr_to_networkx(graph)
+
+    with instrumentation.phase("simulate"), instrumentation.profiled(args.profile):
+        weekly_data = simulate(args, graph, G, total_weeks, num_initial_infections)
+
+    with instrumentation.phase("report"):
+        print_weekly_report(weekly_data, total_weeks)
+        if args.community_report and "community_counts" in weekly_data:
+            print_community_report(
+                weekly_data, [city["name"] for city in population_density], total_weeks
+            )
+    with instrumentation.phase("render"):
+        render(args, graph, G, weekly_data, total_weeks, draw_community_view)
+
+
+# The hybrid engine builds node-level graphs only for its hot spots, so there is
+# no full graph to draw: report, then plot the line graph only
+def simulate_and_report_hybrid(args, total_weeks: int, num_initial_infections: int):
+    population_density, inter_region_connection = REGIONS[args.region]
+    with instrumentation.phase("simulate"), instrumentation.profiled(args.profile):
+        weekly_data = get_status_history_hybrid(
+            population_density,
+            inter_region_connection,
+            num_initial_infections,
+            total_weeks,
+            rng=np.random.default_rng(args.seed),
+            agent_communities=args.agent_communities,
+            promote_at=args.promote_at,
+            max_agent_nodes=args.max_agent_nodes,
+        )
+
+    with instrumentation.phase("report"):
+        print_weekly_report(weekly_data, total_weeks)
+        if args.community_report:
+            print_community_report(
+                weekly_data, [city["name"] for city in population_density], total_weeks
+            )
+        agent_communities = weekly_data["agent_communities"][-1]
+        print(
+            "Simulated node by node: "
+            + (", ".join(agent_communities) if agent_communities else "none")
+        )
+    with instrumentation.phase("render"):
+        visualize_simulation_line_graph(weekly_data, total_weeks)
+
+
+# The mean field needs no graph either; its expected counts are reported
+# rounded to whole people
+def simulate_and_report_mean_field(args, total_weeks: int, num_initial_infections: int):
+    population_density, _ = REGIONS[args.region]
+    with instrumentation.phase("simulate"):
+        weekly_data = solve_mean_field(
+            population_density, num_initial_infections, total_weeks
+        )
+    for series in ("new_cases", "cumulative_cases", "deaths"):
+        weekly_data[series] = [round(value) for value in weekly_data[series]]
+
+    with instrumentation.phase("report"):
+        print_weekly_report(weekly_data, total_weeks)
+    with instrumentation.phase("render"):
+        visualize_simulation_line_graph(weekly_data, total_weeks)
+
+
+# Run the chosen engine (the weekly loop) from freshly seeded initial states
+def simulate(args, graph, G, total_weeks: int, num_initial_infections: int) -> dict:
+    population_density, inter_region_connection = REGIONS[args.region]
+
+    if args.engine == "partitioned":
+        with instrumentation.phase("seed"):
+            initial_states, initial_infected = get_initial_states(
+                graph, num_initial_infections, np.random.default_rng(args.seed)
+            )
+        weekly_data = get_status_history_partitioned(
+            graph_cache_path(
+                population_density, inter_region_connection, args.graph_seed
+            ),
+            initial_states,
+            initial_infected,
+            total_weeks,
+            workers=args.workers,
+            seed=args.seed,
+        )
+    elif args.engine in ("array", "event"):
+        rng = np.random.default_rng(args.seed)
+        with instrumentation.phase("seed"):
+            initial_states, initial_infected = get_initial_states(
+                graph, num_initial_infections, rng
+            )
+        if args.engine == "event":
+            status_history = get_status_history_event
+        else:
+            status_history = get_status_history_csr
+        weekly_data = status_history(
+            G,
+            initial_states,
+            initial_infected,
+            total_weeks,
+            graph=graph,
+            rng=rng,
+        )
+    else:
+        # The dict engine draws from the random module
+        random.seed(args.seed)
+        with instrumentation.phase("seed"):
+            initial_infection_status_dict, initial_infected = (
+                get_initial_infection_status(G, num_initial_infections)
+            )
+        weekly_data = get_status_history(
+            G, initial_infection_status_dict, initial_infected, total_weeks
+        )
+    if args.snapshot_dir is not None:
+        with instrumentation.phase("snapshot"):
+            weekly_data["infection_status_dict_snapshots"].spill(args.snapshot_dir)
+    return weekly_data
+
+
+# Line graph, then the animation export, community view or dot graph
+def render(
+    args, graph, G, weekly_data: dict, total_weeks: int, draw_community_view: bool
+):
+    population_density, inter_region_connection = REGIONS[args.region]
     visualize_simulation_line_graph(weekly_data, total_weeks)
-    if draw_dot_graph:
+    if args.export_animation is not None:
+        cache_path = graph_cache_path(
+            population_density, inter_region_connection, args.graph_seed
+        )
+        load_or_compute_layout(cache_path, graph)
+        # Without --snapshot-dir the workers read a temporary spill of the run
+        snapshot_dir = args.snapshot_dir
+        if snapshot_dir is None:
+            snapshot_dir = tempfile.mkdtemp(prefix="snapshots_")
+            weekly_data["infection_status_dict_snapshots"].spill(snapshot_dir)
+        frames_dir = args.frames_dir
+        if frames_dir is None:
+            frames_dir = os.path.splitext(args.export_animation)[0] + "_frames"
+        try:
+            export_animation(
+                snapshot_dir,
+                os.path.join(cache_path, "layout.npy"),
+                args.export_animation,
+                frames_dir,
+                workers=args.workers,
+            )
+        finally:
+            if args.snapshot_dir is None:
+                shutil.rmtree(snapshot_dir, ignore_errors=True)
+        print(f"Animation saved as {args.export_animation}")
+    elif draw_community_view:
+        visualize_community_graph(
+            graph,
+            weekly_community_counts(weekly_data, graph),
+            [city["name"] for city in population_density],
+            weekly_data["infection_status_dict_snapshots"],
+        )
+    else:
+        positions = load_or_compute_layout(
+            graph_cache_path(
+                population_density, inter_region_connection, args.graph_seed
+            ),
+            graph,
+        )
         visualize_simulation_dotted_graph(
-            G, weekly_data["infection_status_dict_snapshots"], total_weeks
+            G, weekly_data["infection_status_dict_snapshots"], total_weeks, positions
         )
 
 
@@ -0,0 +1,115 @@
+import os
+from collections.abc import Mapping
+from typing import Iterator, Optional
+import numpy as np
+from constants import COMPARTMENTS
+
+
+class StatusView(Mapping):
+    # Read-only node -> "S"/"E"/"I"/"R"/"D" view over one week's state array
+    def __init__(self, states: np.ndarray):
+        self.states = states
+
+    def __getitem__(self, node) -> str:
+        return COMPARTMENTS[self.states[node]]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self.states)))
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+
+class SnapshotStore:
+    # Weekly infection status snapshots stored as one base uint8 state array
+    # plus a sparse delta (changed node ids and their new states) per week
+    def __init__(self, base_states: np.ndarray):
+        self.base = np.array(base_states, dtype=np.uint8)
+        self._latest = self.base.copy()
+        self._delta_ids = []
+        self._delta_states = []
+        # Replay cursor so that scrubbing forward only applies the new deltas
+        self._cursor_week = -1
+        self._cursor_states = self.base.copy()
+        self._spilled = None
+
+    def record(self, states: np.ndarray):
+        changed = np.flatnonzero(states != self._latest)
+        self.record_delta(changed, states[changed])
+
+    def record_delta(self, node_ids: np.ndarray, new_states: np.ndarray):
+        if self._spilled is not None:
+            raise ValueError("cannot record into a spilled snapshot store")
+        node_ids = np.asarray(node_ids, dtype=np.int32)
+        new_states = np.asarray(new_states, dtype=np.uint8)
+        self._latest[node_ids] = new_states
+        self._delta_ids.append(node_ids)
+        self._delta_states.append(new_states)
+
+    def __len__(self) -> int:
+        if self._spilled is not None:
+            return len(self._spilled["offsets"]) - 1
+        return len(self._delta_ids)
+
+    def _delta(self, week: int):
+        if self._spilled is not None:
+            start, end = self._spilled["offsets"][week : week + 2]
+            return (
+                self._spilled["ids"][start:end],
+                self._spilled["states"][start:end],
+            )
+        return self._delta_ids[week], self._delta_states[week]
+
+    # Reconstruct the uint8 state array at the end of the given week
+    def states(self, week: int) -> np.ndarray:
+        if week < 0:
+            week += len(self)
+        if not 0 <= week < len(self):
+            raise IndexError(f"week {week} out of range")
+        if week < self._cursor_week:
+            self._cursor_week = -1
+            self._cursor_states = np.array(self.base)
+        for replay_week in range(self._cursor_week + 1, week + 1):
+            node_ids, new_states = self._delta(replay_week)
+            self._cursor_states[node_ids] = new_states
+        self._cursor_week = week
+        return self._cursor_states.copy()
+
+    def __getitem__(self, week: int) -> StatusView:
+        return StatusView(self.states(week))
+
+    # Write the store to a directory of .npy files and keep it memory-mapped
+    def spill(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        if self._spilled is not None:
+            # Already on disk somewhere else, copy the concatenated arrays over
+            offsets = self._spilled["offsets"]
+            ids, states = self._spilled["ids"], self._spilled["states"]
+        else:
+            offsets = np.zeros(len(self) + 1, dtype=np.int64)
+            np.cumsum([len(ids) for ids in self._delta_ids], out=offsets[1:])
+            ids = _concatenate(self._delta_ids, np.int32)
+            states = _concatenate(self._delta_states, np.uint8)
+        np.save(os.path.join(path, "base.npy"), self.base)
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+        np.save(os.path.join(path, "ids.npy"), ids)
+        np.save(os.path.join(path, "states.npy"), states)
+        loaded = SnapshotStore.load(path)
+        self.__dict__.update(loaded.__dict__)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = "r") -> "SnapshotStore":
+        store = cls(np.load(os.path.join(path, "base.npy")))
+        store._delta_ids = []
+        store._delta_states = []
+        store._spilled = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ("offsets", "ids", "states")
+        }
+        return store
+
+
+def _concatenate(arrays: list, dtype) -> np.ndarray:
+    if not arrays:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate(arrays).astype(dtype, copy=False)